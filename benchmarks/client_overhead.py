@@ -0,0 +1,96 @@
+"""
+Per call overhead of building a fresh twitter client for every call, like
+authenticate() did, against reusing the cached client from get_client().
+
+Runs against a local stub server, so the numbers show client construction and
+connection setup only. Against api.twitter.com the fresh client also pays a TLS
+handshake on every call, which the cached client doesn't.
+
+    python benchmarks/client_overhead.py --calls 500
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import tweepy
+
+from lena_tweets.client import TwitterClient
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps([]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("x-rate-limit-limit", "900")
+        self.send_header("x-rate-limit-remaining", "899")
+        self.send_header("x-rate-limit-reset", str(int(time.time()) + 900))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _auth():
+    auth = tweepy.OAuthHandler("stub-key", "stub-secret")
+    auth.set_access_token("stub-token", "stub-token-secret")
+    return auth
+
+
+def fresh_client_call(api_root: str):
+    client = TwitterClient(_auth(), api_root=api_root)
+    try:
+        client.user_timeline(user_id=1, count=200)
+    finally:
+        client.close()
+
+
+def time_calls(func, calls: int):
+    timings = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name: str, timings):
+    print(
+        f"{name:<16} mean {statistics.mean(timings) * 1000:7.3f} ms"
+        f"   median {statistics.median(timings) * 1000:7.3f} ms"
+        f"   total {sum(timings):6.2f} s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=500)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_root = f"http://127.0.0.1:{server.server_port}/1.1"
+
+    cached = TwitterClient(_auth(), api_root=api_root)
+    # Warm up both paths
+    fresh_client_call(api_root)
+    cached.user_timeline(user_id=1, count=200)
+
+    report("fresh client", time_calls(lambda: fresh_client_call(api_root), args.calls))
+    report(
+        "cached client",
+        time_calls(lambda: cached.user_timeline(user_id=1, count=200), args.calls),
+    )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
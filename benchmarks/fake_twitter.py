@@ -0,0 +1,461 @@
+"""
+Local stand-in for the parts of the twitter v1.1 api that lena_tweets uses:
+users/show, users/lookup, friends/ids, friends/list and statuses/user_timeline.
+
+Users, follow lists and timelines are synthetic but deterministic for a given seed.
+Every user tweets at their own rate from `start` onwards, so new tweets keep appearing
+while the server runs. Calls are rate limited per access token and endpoint like
+twitter does, with a configurable window length and latency.
+
+    python benchmarks/fake_twitter.py --port 8000 --users 50000
+
+and point TWITTER_API_ROOT in lena_tweets/config.py to http://localhost:8000/1.1
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+# Requests per window with user authentication
+RATE_LIMITS = {
+    "friends/ids": 15,
+    "friends/list": 15,
+    "statuses/user_timeline": 900,
+    "users/lookup": 900,
+    "users/show": 900,
+}
+TWITTER_EPOCH_MS = 1288834974657
+MAX_TIMELINE = 3200
+CREATED_AT_FORMAT = "%a %b %d %H:%M:%S +0000 %Y"
+
+
+class FakeTwitter:
+    """
+    Synthetic twitter users with ids 1..n_users, derived from the seed on demand.
+    """
+
+    def __init__(
+        self,
+        n_users: int = 50000,
+        seed: int = 0,
+        start: Optional[float] = None,
+        protected_share: float = 0.02,
+    ):
+        self.n_users = n_users
+        self.seed = seed
+        self.start = start if start is not None else time.time() - 365 * 24 * 3600
+        self.protected_share = protected_share
+
+    def _rng(self, salt: str, user_id: int) -> random.Random:
+        return random.Random(f"{self.seed}-{salt}-{user_id}")
+
+    def exists(self, user_id: int) -> bool:
+        return 1 <= user_id <= self.n_users
+
+    def is_protected(self, user_id: int) -> bool:
+        return self._rng("protected", user_id).random() < self.protected_share
+
+    def tweet_interval_ms(self, user_id: int) -> int:
+        """Milliseconds between tweets, from every ten minutes to once a week"""
+        rng = self._rng("interval", user_id)
+        return int(math.exp(rng.uniform(math.log(600), math.log(7 * 86400))) * 1000)
+
+    def tweet_count(self, user_id: int, now: float) -> int:
+        return max(int((now - self.start) * 1000 // self.tweet_interval_ms(user_id)), 0)
+
+    @lru_cache(maxsize=4096)
+    def friends_ids(self, user_id: int) -> List[int]:
+        rng = self._rng("friends", user_id)
+        count = min(int(rng.lognormvariate(5.5, 1.2)), self.n_users - 1)
+        ids = rng.sample(range(1, self.n_users + 1), count + 1)
+        return [i for i in ids if i != user_id][:count]
+
+    def user(self, user_id: int, now: float) -> dict:
+        rng = self._rng("profile", user_id)
+        return {
+            "id": user_id,
+            "id_str": str(user_id),
+            "name": f"Fake User {user_id}",
+            "screen_name": f"user{user_id}",
+            "location": rng.choice(["", "London", "Budapest", "Berlin"]),
+            "description": f"Synthetic account number {user_id} for benchmarking",
+            "url": None,
+            "protected": self.is_protected(user_id),
+            "followers_count": rng.randint(0, 100000),
+            "friends_count": len(self.friends_ids(user_id)),
+            "listed_count": rng.randint(0, 100),
+            "created_at": _created_at(self.start * 1000),
+            "favourites_count": rng.randint(0, 10000),
+            "verified": False,
+            "statuses_count": self.tweet_count(user_id, now),
+            "lang": None,
+            "profile_image_url_https": f"https://example.com/{user_id}.png",
+            "default_profile": True,
+        }
+
+    def tweet_created_ms(self, user_id: int, k: int) -> int:
+        return int(self.start * 1000) + k * self.tweet_interval_ms(user_id)
+
+    def tweet_id(self, user_id: int, k: int) -> int:
+        return (self.tweet_created_ms(user_id, k) - TWITTER_EPOCH_MS) << 22 | (
+            user_id & 0x3FFFFF
+        )
+
+    def _k_at_most(self, user_id: int, tweet_id: int) -> int:
+        """Largest k whose tweet id is <= tweet_id"""
+        created_ms = (tweet_id >> 22) + TWITTER_EPOCH_MS
+        k = (created_ms - int(self.start * 1000)) // self.tweet_interval_ms(user_id)
+        while k >= 0 and self.tweet_id(user_id, k) > tweet_id:
+            k -= 1
+        return k
+
+    def tweet(self, user: dict, k: int) -> dict:
+        user_id = user["id"]
+        created_ms = self.tweet_created_ms(user_id, k)
+        rng = self._rng(f"tweet{k}", user_id)
+        text = f"Tweet {k} of {user['screen_name']}"
+        if rng.random() < 0.1:
+            text += "\nwith a second line"
+        tweet_id = self.tweet_id(user_id, k)
+        return {
+            "created_at": _created_at(created_ms),
+            "id": tweet_id,
+            "id_str": str(tweet_id),
+            "text": text,
+            "truncated": False,
+            "entities": {
+                "hashtags": [],
+                "symbols": [],
+                "user_mentions": [],
+                "urls": [],
+            },
+            "source": "<a href='https://example.com'>fake</a>",
+            "in_reply_to_status_id": None,
+            "in_reply_to_user_id": None,
+            "user": user,
+            "geo": None,
+            "coordinates": None,
+            "place": None,
+            "is_quote_status": False,
+            "retweet_count": rng.randint(0, 50),
+            "favorite_count": rng.randint(0, 200),
+            "favorited": False,
+            "retweeted": False,
+            "lang": "en",
+        }
+
+    def timeline(
+        self,
+        user_id: int,
+        now: float,
+        since_id: Optional[int] = None,
+        max_id: Optional[int] = None,
+        count: int = 20,
+    ) -> List[dict]:
+        """Newest first, only the most recent 3200 tweets, like twitter"""
+        total = self.tweet_count(user_id, now)
+        newest, oldest = total - 1, max(total - MAX_TIMELINE, 0)
+        if max_id is not None:
+            newest = min(newest, self._k_at_most(user_id, max_id))
+        if since_id is not None:
+            oldest = max(oldest, self._k_at_most(user_id, since_id) + 1)
+        user = self.user(user_id, now)
+        return [
+            self.tweet(user, k)
+            for k in range(newest, max(oldest, newest - min(count, 200) + 1) - 1, -1)
+        ]
+
+
+def _created_at(ms: float) -> str:
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime(CREATED_AT_FORMAT)
+
+
+class RateLimiter:
+    """Fixed windows per (token, endpoint), starting with the first call in them"""
+
+    def __init__(self, window: float = 900, limits: Dict[str, int] = RATE_LIMITS):
+        self.window = window
+        self.limits = limits
+        self._windows: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, token: str, endpoint: str, now: float) -> Tuple[bool, int, int, int]:
+        """Returns whether the call is allowed, limit, remaining, reset"""
+        limit = self.limits.get(endpoint, 15)
+        with self._lock:
+            reset, remaining = self._windows.get((token, endpoint), (0, limit))
+            if now >= reset:
+                reset, remaining = now + self.window, limit
+            allowed = remaining > 0
+            remaining = max(remaining - 1, 0)
+            self._windows[(token, endpoint)] = (reset, remaining)
+        return allowed, limit, remaining, int(math.ceil(reset))
+
+
+class FakeTwitterServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, twitter: FakeTwitter, window=900, latency=0.05):
+        super().__init__(address, FakeTwitterHandler)
+        self.twitter = twitter
+        self.rate_limiter = RateLimiter(window)
+        self.latency = latency
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def api_root(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/1.1"
+
+    def count(self, **counts):
+        with self._stats_lock:
+            self.stats.update(counts)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self.stats)
+
+
+class FakeTwitterHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: FakeTwitterServer
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def _params(self) -> Dict[str, str]:
+        params = dict(parse_qsl(urlparse(self.path).query))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params.update(parse_qsl(self.rfile.read(length).decode()))
+        return params
+
+    def _token(self) -> str:
+        auth = self.headers.get("Authorization", "")
+        match = re.search(r'oauth_token="([^"]*)"', auth) or re.search(
+            r'oauth_consumer_key="([^"]*)"', auth
+        )
+        return match.group(1) if match else "anonymous"
+
+    def _send(self, status: int, body, headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self):
+        path = urlparse(self.path).path
+        params = self._params()
+        if path == "/stats.json":
+            return self._send(200, self.server.snapshot())
+
+        endpoint = path[len("/1.1/") : -len(".json")]
+        handler = ENDPOINTS.get(endpoint)
+        if not path.startswith("/1.1/") or handler is None:
+            return self._send(
+                404,
+                {"errors": [{"code": 34, "message": "Sorry, that page does not exist."}]},
+            )
+
+        now = time.time()
+        allowed, limit, remaining, reset = self.server.rate_limiter.take(
+            self._token(), endpoint, now
+        )
+        headers = {
+            "x-rate-limit-limit": str(limit),
+            "x-rate-limit-remaining": str(remaining),
+            "x-rate-limit-reset": str(reset),
+        }
+        if not allowed:
+            self.server.count(**{"calls": 1, "rate_limited": 1})
+            return self._send(
+                429,
+                {"errors": [{"code": 88, "message": "Rate limit exceeded"}]},
+                headers,
+            )
+
+        if self.server.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.server.latency)
+        status, body = handler(self.server.twitter, params, now)
+        self.server.count(**{"calls": 1, endpoint: 1})
+        if endpoint == "statuses/user_timeline" and status == 200:
+            self.server.count(tweets=len(body))
+        self._send(status, body, headers)
+
+
+def _user_id(twitter: FakeTwitter, params: Dict[str, str]) -> Optional[int]:
+    value = params.get("user_id") or params.get("id") or params.get("screen_name")
+    if value is None:
+        return None
+    if value.startswith("user"):
+        value = value[len("user") :]
+    try:
+        user_id = int(value)
+    except ValueError:
+        return None
+    return user_id if twitter.exists(user_id) else None
+
+
+def _not_found():
+    return 404, {"errors": [{"code": 50, "message": "User not found."}]}
+
+
+def _not_authorized():
+    return 401, {"request": "", "error": "Not authorized."}
+
+
+def _cursor_page(items: list, params: Dict[str, str], max_count: int):
+    cursor = int(params.get("cursor", -1))
+    start = 0 if cursor == -1 else cursor
+    count = min(int(params.get("count", max_count)), max_count)
+    end = start + count
+    return items[start:end], start if start else 0, end if end < len(items) else 0
+
+
+def users_show(twitter: FakeTwitter, params, now):
+    user_id = _user_id(twitter, params)
+    if user_id is None:
+        return _not_found()
+    return 200, twitter.user(user_id, now)
+
+
+def users_lookup(twitter: FakeTwitter, params, now):
+    keys = (params.get("user_id") or params.get("screen_name") or "").split(",")[:100]
+    users = []
+    for key in keys:
+        user_id = _user_id(twitter, {"id": key})
+        if user_id is not None:
+            users.append(twitter.user(user_id, now))
+    if not users:
+        return (
+            404,
+            {"errors": [{"code": 17, "message": "No user matches for specified terms."}]},
+        )
+    return 200, users
+
+
+def friends_ids(twitter: FakeTwitter, params, now):
+    user_id = _user_id(twitter, params)
+    if user_id is None:
+        return _not_found()
+    if twitter.is_protected(user_id):
+        return _not_authorized()
+    ids, previous_cursor, next_cursor = _cursor_page(
+        twitter.friends_ids(user_id), params, 5000
+    )
+    return 200, {
+        "ids": ids,
+        "previous_cursor": previous_cursor,
+        "next_cursor": next_cursor,
+        "previous_cursor_str": str(previous_cursor),
+        "next_cursor_str": str(next_cursor),
+    }
+
+
+def friends_list(twitter: FakeTwitter, params, now):
+    user_id = _user_id(twitter, params)
+    if user_id is None:
+        return _not_found()
+    if twitter.is_protected(user_id):
+        return _not_authorized()
+    ids, previous_cursor, next_cursor = _cursor_page(
+        twitter.friends_ids(user_id), params, 200
+    )
+    return 200, {
+        "users": [twitter.user(i, now) for i in ids],
+        "previous_cursor": previous_cursor,
+        "next_cursor": next_cursor,
+        "previous_cursor_str": str(previous_cursor),
+        "next_cursor_str": str(next_cursor),
+    }
+
+
+def user_timeline(twitter: FakeTwitter, params, now):
+    user_id = _user_id(twitter, params)
+    if user_id is None:
+        return _not_found()
+    if twitter.is_protected(user_id):
+        return _not_authorized()
+    since_id = params.get("since_id")
+    max_id = params.get("max_id")
+    return 200, twitter.timeline(
+        user_id,
+        now,
+        since_id=int(since_id) if since_id else None,
+        max_id=int(max_id) if max_id else None,
+        count=int(params.get("count", 20)),
+    )
+
+
+ENDPOINTS = {
+    "users/show": users_show,
+    "users/lookup": users_lookup,
+    "friends/ids": friends_ids,
+    "friends/list": friends_list,
+    "statuses/user_timeline": user_timeline,
+}
+
+
+def start_server(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    n_users: int = 50000,
+    seed: int = 0,
+    window: float = 900,
+    latency: float = 0.05,
+) -> FakeTwitterServer:
+    """Starts a server on a background thread and returns it"""
+    server = FakeTwitterServer(
+        (host, port), FakeTwitter(n_users, seed), window=window, latency=latency
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--window", type=float, default=900, help="rate limit window in seconds"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="mean response latency in seconds"
+    )
+    args = parser.parse_args()
+
+    server = FakeTwitterServer(
+        (args.host, args.port),
+        FakeTwitter(args.users, args.seed),
+        window=args.window,
+        latency=args.latency,
+    )
+    print(f"Serving fake twitter api on {server.api_root}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
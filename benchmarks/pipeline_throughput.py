@@ -0,0 +1,233 @@
+"""
+Runs the pipelines against the fake twitter api and reports throughput for each.
+
+Reports API calls made, tweets fetched per second, users processed per hour and the
+peak of Python memory allocated during the run. Output files go to a temporary
+directory, and the tracker lives in a separate Postgres database that is wiped at the
+start, lena_benchmark by default:
+
+    PYTHONPATH=. python benchmarks/pipeline_throughput.py --participants 20
+
+The fake api compresses the 15 minute rate limit window to --window seconds, so runs
+that would sleep through rate limits finish in reasonable time.
+"""
+import argparse
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import lena_tweets.config as config
+from fake_twitter import start_server
+
+PIPELINES = [
+    "kick_off_study",
+    "daily_user_scrape",
+    "tweet_history",
+    "daily_tweet_scrape",
+]
+# Runs until stopped, so only when asked for, for --collector-minutes
+COLLECTOR = "collector"
+OUTPUT_PATHS = [
+    "COMPACTION_DIR",
+    "FRIEND_EVENTS_PATH",
+    "FRIEND_SNAPSHOTS_DIR",
+    "FRIEND_SPOOL_DIR",
+    "PARQUET_DIR",
+    "STUDY_START_PATH",
+    "STUDY_INPUT_START_PART",
+    "STUDY_END_PATH",
+    "TWEET_HISTORY",
+    "TWEET_INDEX_PATH",
+    "DAILY_TWEETS_PATH",
+]
+
+
+def configure(args, api_root: str, data_dir: Path):
+    """Points config at the fake api, the benchmark database and data_dir"""
+    config.CREDS[:] = [
+        {
+            "API_KEY": f"benchmark-key-{i}",
+            "KEY_SECRET": "benchmark-secret",
+            "ACCESS_TOKEN": f"benchmark-token-{i}",
+            "ACCESS_TOKEN_SECRET": "benchmark-token-secret",
+        }
+        for i in range(args.credentials)
+    ]
+    config.TWITTER_API_ROOT = api_root
+    config.DATABASE_NAME = args.database
+    config.STORE_TWEETS_IN_DATABASE = args.store_tweets
+    config.OUTPUT_FORMAT = args.output_format
+    for setting in ("host", "port", "user", "password"):
+        value = getattr(args, f"postgres_{setting}")
+        if value is not None:
+            setattr(config, f"POSTGRES_{setting.upper()}", value)
+    for name in OUTPUT_PATHS:
+        setattr(config, name, str(data_dir / Path(getattr(config, name)).name))
+
+
+def run_config(name: str, concurrency: int, collector_minutes: float) -> dict:
+    timestamp = datetime.now().strftime(config.TIMESTAMP_FORMAT)
+    if name == "kick_off_study":
+        return {}
+    if name == COLLECTOR:
+        collector_config = {
+            "concurrency": concurrency,
+            "history_concurrency": concurrency,
+            "hours": collector_minutes / 60,
+        }
+        return {"solids": {"run_collector": {"config": collector_config}}}
+    if name == "daily_user_scrape":
+        return {
+            "solids": {"get_friends_of_users": {"config": {"timestamp": timestamp}}}
+        }
+    solid_config = {
+        "config": {"timestamp": timestamp, "concurrency": concurrency},
+    }
+    if name == "tweet_history":
+        solid_config["inputs"] = {"all_tweets": True}
+    return {"solids": {"collect_tweets_of_users": solid_config}}
+
+
+def users_processed(name: str, since: datetime) -> int:
+    from lena_tweets.database import Tracker, connection_manager
+
+    column = {
+        "kick_off_study": Tracker.friends_last_retrieved,
+        "daily_user_scrape": Tracker.friends_last_retrieved,
+        "tweet_history": Tracker.history_retrieved,
+        "daily_tweet_scrape": Tracker.tweets_last_retrieved,
+        COLLECTOR: Tracker.tweets_last_retrieved,
+    }[name]
+    with connection_manager():
+        return Tracker.select().where(column >= since).count()
+
+
+def reset_database():
+    from lena_tweets.database import (
+        connection_manager,
+        create_tables,
+        drop_tables,
+        get_database,
+    )
+
+    with connection_manager():
+        db = get_database()
+        drop_tables(db)
+        create_tables(db)
+
+
+def run_pipeline(
+    name: str, concurrency: int, server, collector_minutes: float = 1
+) -> dict:
+    from dagster import execute_pipeline
+
+    import lena_tweets.pipelines
+
+    calls_before = server.snapshot()
+    started_at = datetime.now()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = execute_pipeline(
+        getattr(lena_tweets.pipelines, name),
+        run_config=run_config(name, concurrency, collector_minutes),
+        raise_on_error=False,
+    )
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls_after = server.snapshot()
+
+    def delta(key):
+        return calls_after.get(key, 0) - calls_before.get(key, 0)
+
+    users = users_processed(name, started_at)
+    return {
+        "pipeline": name,
+        "success": result.success,
+        "seconds": elapsed,
+        "calls": delta("calls"),
+        "rate_limited": delta("rate_limited"),
+        "tweets": delta("tweets"),
+        "tweets_per_second": delta("tweets") / elapsed,
+        "users": users,
+        "users_per_hour": users / elapsed * 3600,
+        "peak_mb": peak / 2 ** 20,
+    }
+
+
+def report(results):
+    columns = [
+        ("pipeline", 20, ""),
+        ("success", 7, ""),
+        ("seconds", 8, ".1f"),
+        ("calls", 7, "d"),
+        ("rate_limited", 12, "d"),
+        ("tweets", 8, "d"),
+        ("tweets_per_second", 17, ".1f"),
+        ("users", 6, "d"),
+        ("users_per_hour", 14, ".0f"),
+        ("peak_mb", 8, ".1f"),
+    ]
+    print(" ".join(name.rjust(width) for name, width, _ in columns))
+    for result in results:
+        print(
+            " ".join(
+                format(result[name], spec).rjust(width)
+                for name, width, spec in columns
+            )
+        )
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nPeak resident memory of the whole benchmark: {max_rss:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--pipelines", nargs="+", default=PIPELINES, choices=PIPELINES + [COLLECTOR]
+    )
+    parser.add_argument("--collector-minutes", type=float, default=1)
+    parser.add_argument("--participants", type=int, default=20)
+    parser.add_argument("--users", type=int, default=50000)
+    parser.add_argument("--credentials", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--window", type=float, default=60)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", default="lena_benchmark")
+    parser.add_argument(
+        "--store-tweets", action="store_true", help="Store tweets in Postgres too"
+    )
+    parser.add_argument("--output-format", default="csv", choices=["csv", "parquet"])
+    parser.add_argument("--postgres-host")
+    parser.add_argument("--postgres-port", type=int)
+    parser.add_argument("--postgres-user")
+    parser.add_argument("--postgres-password")
+    args = parser.parse_args()
+
+    server = start_server(
+        n_users=args.users, seed=args.seed, window=args.window, latency=args.latency
+    )
+    with tempfile.TemporaryDirectory() as data_dir:
+        configure(args, server.api_root, Path(data_dir))
+        participants = random.Random(args.seed).sample(
+            range(1, args.users + 1), args.participants
+        )
+        Path(config.STUDY_INPUT_START_PART).write_text(
+            "".join(f"user{user_id}\n" for user_id in participants)
+        )
+        reset_database()
+
+        results = [
+            run_pipeline(name, args.concurrency, server, args.collector_minutes)
+            for name in args.pipelines
+        ]
+    server.shutdown()
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Times evaluating a minute schedule's tick as the study it belongs to gets longer.
+
+Compares minute_schedule, which works out the partition of a tick from its time, with
+building the list of every partition since the start of the study and searching it,
+as it did before, for a */3 schedule that has run for each of --days:
+
+    PYTHONPATH=. python benchmarks/schedule_partitions.py --days 1 30 180 365
+
+The list takes minutes a tick for a year, so the whole run takes about a quarter of
+an hour with the defaults.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import pendulum
+from dagster import DagsterInstance
+from dagster.core.definitions.partition import (
+    PartitionSetDefinition,
+    create_default_partition_selector_fn,
+)
+from dagster.core.definitions.schedule import ScheduleExecutionContext
+from dagster.utils.partitions import DEFAULT_HOURLY_FORMAT_WITH_TIMEZONE
+
+from lena_tweets.partition_schedule import minute_schedule, schedule_partition_range
+
+CRON_SCHEDULE = "*/3 * * * *"
+TIMEZONE = "UTC"
+
+
+def to_partition(execution_time):
+    return pendulum.instance(execution_time).subtract(minutes=1)
+
+
+def run_config(date):
+    return {"timestamp": date.isoformat()}
+
+
+def schedules(start: datetime, end: datetime):
+    """The schedule from minute_schedule, and one over a list of every partition"""
+    lazy = minute_schedule(
+        pipeline_name="benchmark",
+        start_date=start,
+        end_date=end,
+        cron_schedule=CRON_SCHEDULE,
+        execution_timezone=TIMEZONE,
+        name="lazy",
+    )(run_config)
+
+    fmt = DEFAULT_HOURLY_FORMAT_WITH_TIMEZONE
+    listed = PartitionSetDefinition(
+        name="listed_partitions",
+        pipeline_name="benchmark",
+        partition_fn=schedule_partition_range(
+            start,
+            end=end,
+            cron_schedule=CRON_SCHEDULE,
+            fmt=fmt,
+            timezone=TIMEZONE,
+            execution_time_to_partition_fn=to_partition,
+        ),
+        run_config_fn_for_partition=lambda partition: run_config(partition.value),
+    ).create_schedule_definition(
+        "listed",
+        CRON_SCHEDULE,
+        partition_selector=create_default_partition_selector_fn(
+            delta_fn=to_partition, fmt=fmt
+        ),
+        execution_timezone=TIMEZONE,
+    )
+    return lazy, listed
+
+
+def time_tick(schedule, context, repeat: int) -> float:
+    """Best of repeat seconds taken to decide whether to run the tick and its config"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if schedule.should_execute(context):
+            schedule.get_run_config(context)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--days", type=float, nargs="+", default=[1, 30, 180, 365])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    instance = DagsterInstance.ephemeral()
+    end = datetime(2021, 12, 1)
+    # The latest tick with a partition, the latest partition is left out
+    scheduled = pendulum.instance(end, tz=TIMEZONE).subtract(minutes=3)
+    context = ScheduleExecutionContext(instance, scheduled)
+
+    print(f"{'days':>6} {'partitions':>10} {'lazy_ms':>9} {'listed_ms':>10}")
+    for days in args.days:
+        lazy, listed = schedules(end - timedelta(days=days), end)
+        partitions = len(lazy.get_partition_set().get_partitions())
+        lazy_seconds = time_tick(lazy, context, args.repeat)
+        listed_seconds = time_tick(listed, context, args.repeat)
+        print(
+            f"{days:>6g} {partitions:>10d} {lazy_seconds * 1000:>9.2f} "
+            f"{listed_seconds * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Long lived twitter clients, one per credential, that keep their HTTP connections open
+between calls.
+
+tweepy.API opens and closes a new requests session for every call it makes, so
+TwitterClient makes the few v1.1 calls this package needs itself, over one pooled
+session, and parses the results into the same tweepy models.
+"""
+import threading
+from typing import Dict, List, Optional, Union
+
+import requests
+import tweepy
+from requests.adapters import HTTPAdapter
+from tweepy.error import is_rate_limit_error_message
+from tweepy.parsers import JSONParser
+
+import lena_tweets.config
+from lena_tweets.auth import get_auth_handler
+
+
+class TwitterClient:
+    """
+    Calls the twitter v1.1 REST api with one credential.
+
+    Method names, arguments and return values follow tweepy.API, so that a client can
+    be used wherever an authenticated tweepy.API was.
+    """
+
+    def __init__(
+        self,
+        auth: tweepy.OAuthHandler,
+        api_root: Optional[str] = None,
+        pool_size: Optional[int] = None,
+        timeout: int = 60,
+    ):
+        self.api_root = api_root or lena_tweets.config.TWITTER_API_ROOT
+        pool_size = pool_size or lena_tweets.config.HTTP_POOL_SIZE
+        self.timeout = timeout
+        self.auth = auth.apply_auth()
+        # Models hold on to the api they came from, i.e. for user.timeline()
+        self.api = tweepy.API(auth)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._local = threading.local()
+
+    @property
+    def last_response(self) -> Optional[requests.Response]:
+        """Response to the last call made by the current thread"""
+        return getattr(self._local, "last_response", None)
+
+    def request(self, method: str, endpoint: str, **params):
+        """
+        Makes a call and returns the decoded json, raising tweepy errors like tweepy does.
+        """
+        params = {k: v for k, v in params.items() if v is not None}
+        url = f"{self.api_root}/{endpoint}.json"
+        try:
+            if method == "GET":
+                resp = self.session.get(
+                    url, params=params, auth=self.auth, timeout=self.timeout
+                )
+            else:
+                resp = self.session.request(
+                    method, url, data=params, auth=self.auth, timeout=self.timeout
+                )
+        except requests.RequestException as exc:
+            raise tweepy.TweepError(f"Failed to send request: {exc}")
+
+        self._local.last_response = resp
+        if not 200 <= resp.status_code < 300:
+            try:
+                error_msg, api_error_code = JSONParser().parse_error(resp.text)
+            except Exception:
+                error_msg = f"Twitter error response: status code = {resp.status_code}"
+                api_error_code = None
+
+            if resp.status_code == 429 or is_rate_limit_error_message(error_msg):
+                raise tweepy.RateLimitError(error_msg, resp)
+            raise tweepy.TweepError(error_msg, resp, api_code=api_error_code)
+
+        return resp.json()
+
+    def get_user(self, id=None, user_id=None, screen_name=None) -> tweepy.User:
+        data = self.request(
+            "GET", "users/show", id=id, user_id=user_id, screen_name=screen_name
+        )
+        return tweepy.User.parse(self.api, data)
+
+    def lookup_users(
+        self,
+        user_ids: Optional[List[int]] = None,
+        screen_names: Optional[List[str]] = None,
+    ) -> List[tweepy.User]:
+        data = self.request(
+            "POST",
+            "users/lookup",
+            user_id=_list_to_csv(user_ids),
+            screen_name=_list_to_csv(screen_names),
+        )
+        return tweepy.User.parse_list(self.api, data)
+
+    def friends(
+        self, id=None, user_id=None, screen_name=None, cursor: int = -1, count=None
+    ):
+        """Returns users followed, (previous cursor, next cursor)"""
+        data = self.request(
+            "GET",
+            "friends/list",
+            id=id,
+            user_id=user_id,
+            screen_name=screen_name,
+            cursor=cursor,
+            count=count,
+        )
+        return (
+            tweepy.User.parse_list(self.api, data),
+            (data["previous_cursor"], data["next_cursor"]),
+        )
+
+    def friends_ids(
+        self, id=None, user_id=None, screen_name=None, cursor: int = -1, count=None
+    ):
+        """Returns ids followed, (previous cursor, next cursor)"""
+        data = self.request(
+            "GET",
+            "friends/ids",
+            id=id,
+            user_id=user_id,
+            screen_name=screen_name,
+            cursor=cursor,
+            count=count,
+        )
+        return data["ids"], (data["previous_cursor"], data["next_cursor"])
+
+    def user_timeline(
+        self,
+        id=None,
+        user_id=None,
+        screen_name=None,
+        since_id=None,
+        max_id=None,
+        count=None,
+        raw: bool = False,
+    ) -> Union[List[tweepy.Status], List[dict]]:
+        """Returns tweets, or their json as is if raw"""
+        data = self.request(
+            "GET",
+            "statuses/user_timeline",
+            id=id,
+            user_id=user_id,
+            screen_name=screen_name,
+            since_id=since_id,
+            max_id=max_id,
+            count=count,
+        )
+        if raw:
+            return data
+        return tweepy.Status.parse_list(self.api, data)
+
+    def close(self):
+        self.session.close()
+
+
+def _list_to_csv(items: Optional[List[Union[int, str]]]) -> Optional[str]:
+    if items:
+        return ",".join(str(i) for i in items)
+    return None
+
+
+_clients: Dict[int, TwitterClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(cred_id: int) -> TwitterClient:
+    """
+    Returns the process wide client for a credential, building it on first use.
+    """
+    with _clients_lock:
+        if cred_id not in _clients:
+            _clients[cred_id] = TwitterClient(get_auth_handler(cred_id))
+        return _clients[cred_id]
@@ -1,5 +1,8 @@
 TIMESTAMP_FORMAT = "%d-%m-%Y"
-DAILY_FRIENDS_CHECK_PATH = "/app/data/{}_users_friends.csv"
+FRIEND_EVENTS_PATH = "/app/data/friend_events.csv"
+FRIEND_SNAPSHOTS_DIR = "/app/data/friend_snapshots"
+# Follow lists are spooled here a page at a time while they are fetched
+FRIEND_SPOOL_DIR = "/app/data/friend_spool"
 STUDY_START_PATH = "/app/data/users_study_start.csv"
 STUDY_INPUT_START_PART = "/app/data/study_input.txt"
 STUDY_END_PATH = "/app/data/users_study_end.csv"
@@ -12,6 +15,74 @@ POSTGRES_HOST = "lena-postgres"
 POSTGRES_PORT = 5432  # default
 POSTGRES_USER = "lena"
 POSTGRES_PASSWORD = "lena_123"
+# Connections kept open and shared between the threads of a process. Threads wait up
+# to DATABASE_POOL_TIMEOUT seconds for one when all are in use, and connections idle
+# for over DATABASE_STALE_TIMEOUT seconds are closed.
+DATABASE_POOL_SIZE = 10
+DATABASE_POOL_TIMEOUT = 30
+DATABASE_STALE_TIMEOUT = 5 * 60
+# Rows added to the tracker per INSERT
+TRACKER_INSERT_BATCH = 1000
+# Users picked by a run are leased to it for this many seconds, or until it's done with
+# them, and other runs pass over them meanwhile. Leases of crashed runs run out.
+TRACKER_LEASE = 10 * 60
+# Tweets are written out as "csv" files, or "parquet" files under PARQUET_DIR, split
+# by the day they were collected and into PARQUET_USER_SHARDS by user. Parquet files
+# are written once PARQUET_ROW_GROUP_SIZE tweets are collected, and at the end of runs.
+OUTPUT_FORMAT = "csv"
+# Tweets are buffered and written out, with the tracker moved on past them, once
+# CSV_BUFFER_SIZE are buffered (PARQUET_ROW_GROUP_SIZE for parquet) or
+# SINK_FLUSH_INTERVAL seconds after they were last written out (PARQUET_FLUSH_INTERVAL
+# for parquet). Keep both well under TRACKER_LEASE, or users are leased out again
+# before their tweets are written out.
+CSV_BUFFER_SIZE = 10000
+SINK_FLUSH_INTERVAL = 30
+PARQUET_DIR = "/app/data/parquet"
+PARQUET_USER_SHARDS = 8
+PARQUET_ROW_GROUP_SIZE = 100000
+PARQUET_FLUSH_INTERVAL = 5 * 60
+PARQUET_COMPRESSION = "zstd"
+# Collected tweet csv files are merged into gzipped segments under COMPACTION_DIR,
+# sorted by user and tweet id and without duplicates. Once there are more than
+# COMPACTION_MAX_SEGMENTS segments they are merged into one.
+COMPACTION_DIR = "/app/data/compacted"
+COMPACTION_MAX_SEGMENTS = 8
+# Where in the collected tweet csv files each user's tweets are, for
+# lena_tweets.tweet_reader
+TWEET_INDEX_PATH = "/app/data/tweet_index.sqlite"
+# Also store tweets in the tweet table, partitioned by month, besides the csv files
+STORE_TWEETS_IN_DATABASE = False
+
+TWITTER_API_ROOT = "https://api.twitter.com/1.1"
+# Kept alive HTTP connections per credential
+HTTP_POOL_SIZE = 10
+
+# Failed calls are retried after RETRY_BASE_DELAY * 2 ** try seconds with jitter,
+# waiting at most RETRY_MAX_DELAY between tries and giving up after RETRY_TIME_BUDGET
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 60
+RETRY_TIME_BUDGET = 5 * 60
+
+# Number of users whose tweets are fetched in parallel
+DAILY_TWEETS_CONCURRENCY = 4
+TWEET_HISTORY_CONCURRENCY = 4
+# Number of users/lookup batches of 100 in flight at once
+LOOKUP_CONCURRENCY = 4
+# Looked up profiles are reused for this many seconds instead of looked up again
+PROFILE_CACHE_TTL = 24 * 60 * 60
+PROFILE_CACHE_SIZE = 100000
+# Users are polled for new tweets when they are expected to have about
+# TWEET_POLL_TARGET, going by their posting rate, but at most every
+# TWEET_POLL_MIN_INTERVAL seconds and at least every TWEET_POLL_MAX_INTERVAL
+TWEET_POLL_TARGET = 50
+TWEET_POLL_MIN_INTERVAL = 15 * 60
+TWEET_POLL_MAX_INTERVAL = 2 * 24 * 60 * 60
+# Weight of the latest poll in the posting rate, against the polls before it
+TWEET_RATE_SMOOTHING = 0.5
+# The collector pipeline sleeps at most this many seconds when there is nothing to do
+# or no rate limit budget to do it with, and reports its progress this often
+COLLECTOR_IDLE_SLEEP = 60
+COLLECTOR_REPORT_INTERVAL = 5 * 60
 
 # Fill out before deploying!
 CREDS = []
@@ -1,3 +1,4 @@
+import threading
 from contextlib import ContextDecorator
 from datetime import datetime
 
@@ -8,60 +9,81 @@ from peewee import (
     ColumnFactory,
     DateTimeField,
     DeferredForeignKey,
+    FloatField,
     ForeignKeyField,
+    ModelIndex,
     BigIntegerField,
     ModelSelect,
-    ProgrammingError,
+    SQL,
     TextField,
     Model,
+    fn,
 )
-from playhouse.postgres_ext import BinaryJSONField, PostgresqlExtDatabase
+from playhouse.migrate import PostgresqlMigrator, migrate
+from playhouse.postgres_ext import BinaryJSONField
+
+try:
+    from playhouse.postgres_ext import PooledPostgresqlExtDatabase
+except ImportError:
+    # peewee < 4
+    from playhouse.pool import PooledPostgresqlExtDatabase
 from playhouse.signals import Model
 
 import lena_tweets.config
 
-database = PostgresqlExtDatabase(None, autorollback=True)
+database = PooledPostgresqlExtDatabase(None, autorollback=True)
 
 
 class ConnectionContext(ContextDecorator):
-    db = None
-    tables_created = None
-    global_in_context = False
+    """
+    Holds a connection from the pool for the outermost context of each thread, nested
+    contexts reuse it. The tables are set up the first time any context is entered.
+    """
 
-    def __init__(self):
-        self.dont_close_connection = False
+    db = None
+    tables_created = False
+    _setup_lock = threading.Lock()
+    # How deep in contexts each thread is
+    _local = threading.local()
 
     def __enter__(self):
-        if ConnectionContext.global_in_context:
-            self.dont_close_connection = True
-
-        if not ConnectionContext.db:
-            ConnectionContext.db = get_database()
-        if self.db.is_closed():
-            self.db.connect()
-            ConnectionContext.global_in_context = True
+        if not ConnectionContext.tables_created:
+            ConnectionContext._set_up()
 
-        try:
-            # See if the tables are set up
-            Tracker.get_or_none(id=0)
-        except ProgrammingError:
-            create_tables(self.db)
+        depth = getattr(self._local, "depth", 0)
+        if depth == 0:
+            self.db.connect(reuse_if_open=True)
+        self._local.depth = depth + 1
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        if not self.db.in_transaction() and not self.dont_close_connection:
+        self._local.depth -= 1
+        if self._local.depth == 0 and not self.db.in_transaction():
+            # Hands the connection back to the pool
             self.db.close()
-            ConnectionContext.global_in_context = False
+
+    @classmethod
+    def _set_up(cls):
+        with cls._setup_lock:
+            if cls.tables_created:
+                return
+            cls.db = get_database()
+            with cls.db.connection_context():
+                create_tables(cls.db)
+            cls.tables_created = True
 
 
 def get_database():
-    db_name = lena_tweets.config.DATABASE_NAME
-    database.init(
-        db_name,
-        host=lena_tweets.config.POSTGRES_HOST,
-        port=lena_tweets.config.POSTGRES_PORT,
-        user=lena_tweets.config.POSTGRES_USER,
-        password=lena_tweets.config.POSTGRES_PASSWORD,
-    )
+    if database.deferred:
+        database.init(
+            lena_tweets.config.DATABASE_NAME,
+            host=lena_tweets.config.POSTGRES_HOST,
+            port=lena_tweets.config.POSTGRES_PORT,
+            user=lena_tweets.config.POSTGRES_USER,
+            password=lena_tweets.config.POSTGRES_PASSWORD,
+            max_connections=lena_tweets.config.DATABASE_POOL_SIZE,
+            stale_timeout=lena_tweets.config.DATABASE_STALE_TIMEOUT,
+            timeout=lena_tweets.config.DATABASE_POOL_TIMEOUT,
+        )
     return database
 
 
@@ -72,18 +94,68 @@ def get_usable_models():
         Only models derived from EIP's BaseModel will be
         collected.
     """
-    models = [Tracker]
+    models = [Tracker, StudyProfile]
     return models
 
 
 def create_tables(db):
+    """
+    Creates tables and indexes that don't exist yet. Indexes come last, once columns
+    added to the models since the tables were created are there.
+    """
     models = get_usable_models()
-    db.create_tables(models)
+    for model in models:
+        model._schema.create_table(safe=True)
+    add_missing_columns(db)
+    for model in models:
+        model._schema.create_indexes(safe=True)
+    if lena_tweets.config.STORE_TWEETS_IN_DATABASE:
+        create_tweet_table(db)
+
+
+def create_tweet_table(db):
+    """
+    Creates the tweet table, partitioned by the month tweets were created in. The
+    partitions themselves are created as tweets for their month come in.
+    """
+    db.execute_sql(
+        """
+        CREATE TABLE IF NOT EXISTS tweet (
+            id BIGINT NOT NULL,
+            user_id BIGINT NOT NULL,
+            text TEXT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS tweet_user_id_created_at "
+        "ON tweet (user_id, created_at)"
+    )
+
+
+def add_missing_columns(db):
+    """
+    Adds columns that were added to models after their tables were created.
+    """
+    migrator = PostgresqlMigrator(db)
+    for model in get_usable_models():
+        table = model._meta.table_name
+        existing = {column.name for column in db.get_columns(table)}
+        migrate(
+            *[
+                migrator.add_column(table, field.column_name, field)
+                for field in model._meta.sorted_fields
+                if field.column_name not in existing
+            ]
+        )
 
 
 def drop_tables(db):
     models = get_usable_models()
     db.drop_tables(models, cascade=True)
+    db.execute_sql("DROP TABLE IF EXISTS tweet CASCADE")
 
 
 def connection_manager():
@@ -101,6 +173,62 @@ class Tracker(Model):
     friends_last_retrieved = DateTimeField(null=True)
     creation_date = DateTimeField(default=datetime.utcnow())
     participant = BooleanField(default=False)
+    # Where an unfinished walk back through the user's timeline got to
+    history_max_id = BigIntegerField(null=True)
+    history_retrieved = DateTimeField(null=True)
+    # Tweets per hour, and when the user is expected to have enough new ones to poll
+    tweet_rate = FloatField(null=True)
+    tweets_next_due = DateTimeField(null=True)
+    # Until when a run has picked the user to check the friends of, or to collect the
+    # tweets of. Tweet history and new tweet runs share a lease, since both move on
+    # latest_tweet_id.
+    friends_lease_expires = DateTimeField(null=True)
+    tweets_lease_expires = DateTimeField(null=True)
+    # Where an unfinished fetch of the participant's follow list got to
+    friends_cursor = BigIntegerField(null=True)
+
+    class Meta:
+        database = database
+
+
+# When a user is due a poll for new tweets, users never polled being due straight away
+tweets_due_at = fn.COALESCE(Tracker.tweets_next_due, SQL("'-infinity'::timestamp"))
+
+# Each picks the next users to work on in order, so that stays quick however many
+# users are tracked
+Tracker.add_index(
+    ModelIndex(
+        Tracker,
+        (Tracker.friends_last_retrieved.asc(nulls="first"),),
+        name="tracker_participant_friends_last_retrieved",
+        where=Tracker.participant == True,
+    )
+)
+Tracker.add_index(
+    ModelIndex(
+        Tracker,
+        (tweets_due_at,),
+        name="tracker_tweets_due_at",
+    )
+)
+Tracker.add_index(
+    ModelIndex(
+        Tracker,
+        (Tracker.history_max_id.desc(nulls="last"), Tracker.id),
+        name="tracker_history_outstanding",
+        where=Tracker.history_retrieved.is_null(),
+    )
+)
+
+
+class StudyProfile(Model):
+    """
+    Users whose profiles are in the study start csv, so kick_off_study can tell who it
+    has seen without reading the csv back in.
+    """
+
+    user_id = BigIntegerField(unique=True)
+    screen_name = CharField(index=True)
 
     class Meta:
         database = database
@@ -0,0 +1,170 @@
+"""
+Who participants follow, kept as follow and unfollow events rather than daily copies of
+every follow list.
+
+Each fetched follow list is compared with the one before, kept as a sorted array of
+ids per participant, and only the differences are appended to the events csv. The
+first fetch for a participant records everyone they follow as INITIAL rather than as
+followed, since when they followed them isn't known.
+
+Follow lists are spooled to disk a page at a time while they are fetched, as 8 byte
+ids, so a fetch that is cut short can carry on where it got to.
+"""
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from lena_tweets.config import (
+    FRIEND_EVENTS_PATH,
+    FRIEND_SNAPSHOTS_DIR,
+    FRIEND_SPOOL_DIR,
+)
+
+FOLLOW = "follow"
+UNFOLLOW = "unfollow"
+# Followed when the participant's follow list was first fetched
+INITIAL = "initial"
+EVENT_COLUMNS = ["timestamp", "user_id", "friends_id", "event"]
+
+
+def _snapshot_path(user_id: int) -> Path:
+    return Path(FRIEND_SNAPSHOTS_DIR) / f"{user_id}.npy"
+
+
+def load_friends(user_id: int) -> np.ndarray:
+    """Sorted ids the user followed when last fetched"""
+    path = _snapshot_path(user_id)
+    if not path.exists():
+        return np.empty(0, dtype=np.int64)
+    return np.load(path)
+
+
+def record_friends(
+    user_id: int, friends_ids: Iterable[int], timestamp: datetime = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Records who user_id follows now, appending what changed since the last fetch to
+    the events csv. Returns the ids followed and unfollowed since, none the first time.
+    """
+    timestamp = timestamp or datetime.now()
+    if not isinstance(friends_ids, np.ndarray):
+        friends_ids = np.fromiter(friends_ids, dtype=np.int64)
+    current = np.unique(friends_ids.astype(np.int64))
+    if not _snapshot_path(user_id).exists():
+        _append_events(user_id, current, [], timestamp, first_event=INITIAL)
+        _save_snapshot(user_id, current)
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    previous = load_friends(user_id)
+    followed = np.setdiff1d(current, previous, assume_unique=True)
+    unfollowed = np.setdiff1d(previous, current, assume_unique=True)
+
+    if len(followed) or len(unfollowed):
+        _append_events(user_id, followed, unfollowed, timestamp)
+        _save_snapshot(user_id, current)
+    return followed, unfollowed
+
+
+def _append_events(
+    user_id: int,
+    followed: np.ndarray,
+    unfollowed: np.ndarray,
+    timestamp: datetime,
+    first_event: str = FOLLOW,
+):
+    """Appends followed as first_event events, and unfollowed as unfollows"""
+    if not len(followed) and not len(unfollowed):
+        return
+    events = pd.DataFrame(
+        {
+            "timestamp": timestamp.replace(microsecond=0),
+            "user_id": user_id,
+            "friends_id": np.concatenate([followed, unfollowed]).astype(np.int64),
+            "event": [first_event] * len(followed) + [UNFOLLOW] * len(unfollowed),
+        },
+        columns=EVENT_COLUMNS,
+    )
+    path = Path(FRIEND_EVENTS_PATH)
+    # Written in one go, so runs in parallel don't interleave their events
+    text = events.to_csv(index=False, header=not path.exists())
+    with open(path, "a") as f:
+        f.write(text)
+
+
+def _save_snapshot(user_id: int, friends_ids: np.ndarray):
+    path = _snapshot_path(user_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp.npy")
+    np.save(tmp_path, friends_ids)
+    # Only replaces the last snapshot once the new one is complete
+    os.replace(tmp_path, path)
+
+
+def _spool_path(user_id: int) -> Path:
+    return Path(FRIEND_SPOOL_DIR) / f"{user_id}.ids"
+
+
+def has_spool(user_id: int) -> bool:
+    return _spool_path(user_id).exists()
+
+
+def spool_friends(user_id: int, friends_ids: List[int]):
+    """
+    Appends a page of the follow list being fetched, synced to disk before the cursor
+    after it is saved.
+    """
+    path = _spool_path(user_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "ab") as f:
+        np.asarray(friends_ids, dtype=np.int64).tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def read_spool(user_id: int) -> np.ndarray:
+    """The follow list spooled so far, pages fetched twice over included"""
+    path = _spool_path(user_id)
+    if not path.exists():
+        return np.empty(0, dtype=np.int64)
+    return np.fromfile(path, dtype=np.int64)
+
+
+def remove_spool(user_id: int):
+    _spool_path(user_id).unlink(missing_ok=True)
+
+
+def read_events() -> pd.DataFrame:
+    if not Path(FRIEND_EVENTS_PATH).exists():
+        return pd.DataFrame(
+            {
+                "timestamp": pd.Series(dtype="datetime64[ns]"),
+                "user_id": pd.Series(dtype=np.int64),
+                "friends_id": pd.Series(dtype=np.int64),
+                "event": pd.Series(dtype=object),
+            }
+        )
+    return pd.read_csv(
+        FRIEND_EVENTS_PATH,
+        dtype={"user_id": np.int64, "friends_id": np.int64, "event": object},
+        parse_dates=["timestamp"],
+    )
+
+
+def friends_on(day: date) -> pd.DataFrame:
+    """
+    Who each participant followed at the end of day, as rows of user_id, friends_id
+    like the daily friends csv.
+    """
+    events = read_events()
+    end = pd.Timestamp(day) + timedelta(days=1)
+    events = events[events["timestamp"] < end].sort_values("timestamp", kind="stable")
+    # The last event for each pair says whether they still follow
+    latest = events.drop_duplicates(["user_id", "friends_id"], keep="last")
+    following = latest[latest["event"].isin([FOLLOW, INITIAL])]
+    return following[["user_id", "friends_id"]].sort_values(
+        ["user_id", "friends_id"], ignore_index=True
+    )
@@ -0,0 +1,53 @@
+"""
+Which users are in the tracker already, kept in memory so that only new ones are sent
+to the database.
+"""
+from typing import Iterable
+
+import numpy as np
+
+from lena_tweets.database import connection_manager, database
+
+
+class KnownUsers:
+    """
+    Sorted array of tracked user ids. Load it at the start of a run and add the users
+    the run tracks to it.
+
+    Users added by other runs in the meantime are missing, which only means they are
+    sent to the database again, where they are skipped.
+    """
+
+    def __init__(self, user_ids: np.ndarray = None):
+        """user_ids need to be distinct, as they are in the tracker"""
+        if user_ids is None:
+            user_ids = np.empty(0, dtype=np.int64)
+        self._ids = np.sort(user_ids.astype(np.int64))
+
+    @classmethod
+    @connection_manager()
+    def load(cls) -> "KnownUsers":
+        cursor = database.execute_sql("SELECT user_id FROM tracker")
+        return cls(
+            np.fromiter((row[0] for row in cursor), np.int64, count=cursor.rowcount)
+        )
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, user_id: int) -> bool:
+        i = np.searchsorted(self._ids, user_id)
+        return i < len(self._ids) and self._ids[i] == user_id
+
+    def new(self, user_ids: Iterable[int]) -> np.ndarray:
+        """The distinct ids of user_ids that aren't known, sorted"""
+        ids = np.unique(np.fromiter(user_ids, dtype=np.int64))
+        if not len(self._ids):
+            return ids
+        positions = np.searchsorted(self._ids, ids).clip(max=len(self._ids) - 1)
+        return ids[self._ids[positions] != ids]
+
+    def add(self, user_ids: Iterable[int]):
+        ids = self.new(user_ids)
+        if len(ids):
+            self._ids = np.insert(self._ids, np.searchsorted(self._ids, ids), ids)
@@ -1,17 +1,27 @@
 """
 Adapted from Dagster's hourly schedule to have a minute partition.
+
+Schedules that run every few minutes work out their partitions from their position,
+see MinutePartitions, rather than walking the schedule from its start every tick.
 """
 import datetime
 import warnings
+from collections.abc import Sequence
 
 import pendulum
 from croniter import croniter
 from dagster import check
 from dagster.core.definitions.partition import (
+    Partition,
+    PartitionScheduleDefinition,
     PartitionSetDefinition,
     create_default_partition_selector_fn,
 )
-from dagster.core.errors import DagsterInvalidDefinitionError
+from dagster.core.definitions.schedule import ScheduleExecutionContext
+from dagster.core.errors import (
+    DagsterInvalidDefinitionError,
+    DagsterInvariantViolationError,
+)
 from dagster.utils.partitions import (
     DEFAULT_DATE_FORMAT,
     DEFAULT_HOURLY_FORMAT_WITHOUT_TIMEZONE,
@@ -85,14 +95,34 @@ def minute_schedule(
 
     execution_time_to_partition_fn = lambda d: pendulum.instance(d).subtract(minutes=1)
 
-    partition_fn = schedule_partition_range(
-        start_date,
-        end=end_date,
-        cron_schedule=cron_schedule,
-        fmt=fmt,
-        timezone=execution_timezone,
-        execution_time_to_partition_fn=execution_time_to_partition_fn,
-    )
+    step_minutes = minute_step(cron_schedule)
+    if step_minutes is None:
+        partition_set_class = PartitionSetDefinition
+        partition_fn = schedule_partition_range(
+            start_date,
+            end=end_date,
+            cron_schedule=cron_schedule,
+            fmt=fmt,
+            timezone=execution_timezone,
+            execution_time_to_partition_fn=execution_time_to_partition_fn,
+        )
+        partition_selector = create_default_partition_selector_fn(
+            delta_fn=execution_time_to_partition_fn, fmt=fmt,
+        )
+    else:
+        partition_set_class = MinutePartitionSetDefinition
+        partition_fn = minute_partition_range(
+            start_date,
+            end=end_date,
+            cron_schedule=cron_schedule,
+            step_minutes=step_minutes,
+            fmt=fmt,
+            timezone=execution_timezone,
+            execution_time_to_partition_fn=execution_time_to_partition_fn,
+        )
+        partition_selector = minute_partition_selector_fn(
+            delta_fn=execution_time_to_partition_fn, fmt=fmt,
+        )
 
     def inner(fn):
         check.callable_param(fn, "fn")
@@ -105,7 +135,7 @@ def minute_schedule(
                 partition.value
             )
 
-        partition_set = PartitionSetDefinition(
+        partition_set = partition_set_class(
             name="{}_partitions".format(schedule_name),
             pipeline_name=pipeline_name,
             partition_fn=partition_fn,
@@ -120,15 +150,277 @@ def minute_schedule(
             cron_schedule,
             should_execute=should_execute,
             environment_vars=environment_vars,
-            partition_selector=create_default_partition_selector_fn(
-                delta_fn=execution_time_to_partition_fn, fmt=fmt,
-            ),
+            partition_selector=partition_selector,
             execution_timezone=execution_timezone,
         )
 
     return inner
 
 
+def minute_step(cron_schedule: str):
+    """
+    The minutes between runs of cron_schedule if it runs every few minutes, evenly
+    through the hour, otherwise None
+    """
+    parts = cron_schedule.split(" ")
+    if len(parts) != 5 or parts[1:] != ["*"] * 4:
+        return None
+    if parts[0] == "*":
+        return 1
+    if parts[0].startswith("*/") and parts[0][2:].isdigit():
+        step = int(parts[0][2:])
+        if step and 60 % step == 0:
+            return step
+    return None
+
+
+class MinutePartitions(Sequence):
+    """
+    The partitions of a schedule that runs every step seconds, each worked out from
+    its position when it is asked for. Getting the latest partition, or looking one up
+    by name, takes the same time however long the schedule has been running.
+    """
+
+    def __init__(
+        self, first, step, count, fmt, timezone, execution_time_to_partition_fn
+    ):
+        # Timestamp of the execution time of the first partition
+        self.first = first
+        self.step = step
+        self.count = count
+        self.fmt = fmt
+        self.timezone = timezone
+        self.execution_time_to_partition_fn = execution_time_to_partition_fn
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("partition index out of range")
+        execution_time = pendulum.from_timestamp(
+            self.first + i * self.step, tz=self.timezone
+        )
+        partition_time = self.execution_time_to_partition_fn(execution_time)
+        return Partition(value=partition_time, name=partition_time.strftime(self.fmt))
+
+    def index(self, name, start=0, stop=None):
+        """Position of the partition called name, ValueError if there is none"""
+        try:
+            partition_time = datetime.datetime.strptime(name, self.fmt)
+        except ValueError:
+            raise ValueError(f"{name} is not a partition")
+        if partition_time.tzinfo is None:
+            partition_time = pendulum.instance(partition_time, tz=self.timezone)
+        if self.count:
+            # Partitions are step apart, same as their execution times
+            offset = partition_time.timestamp() - self[0].value.timestamp()
+            i = round(offset / self.step)
+            if 0 <= i < self.count and self[i].name == name:
+                return i
+        raise ValueError(f"{name} is not a partition")
+
+    def __contains__(self, partition):
+        name = partition.name if isinstance(partition, Partition) else partition
+        try:
+            self.index(name)
+        except ValueError:
+            return False
+        return True
+
+
+class MinutePartitionSetDefinition(PartitionSetDefinition):
+    """
+    Partition set of MinutePartitions, whose partitions are looked up by name without
+    going through all of them
+    """
+
+    def __new__(cls, name, pipeline_name, partition_fn, **kwargs):
+        partition_set = super().__new__(
+            cls, name, pipeline_name, partition_fn, **kwargs
+        )
+        # PartitionSetDefinition makes partition_fn return a list of the partitions
+        partition_set._minute_partition_fn = partition_fn
+        return partition_set
+
+    def get_partitions(self):
+        return self._minute_partition_fn()
+
+    def get_partition(self, name):
+        partitions = self.get_partitions()
+        try:
+            return partitions[partitions.index(name)]
+        except ValueError:
+            check.failed("Partition name {} not found!".format(name))
+
+    def has_partition(self, name):
+        return name in self.get_partitions()
+
+    def create_schedule_definition(
+        self,
+        schedule_name,
+        cron_schedule,
+        should_execute=None,
+        partition_selector=None,
+        environment_vars=None,
+        execution_timezone=None,
+    ):
+        """
+        Same as PartitionSetDefinition's, but checks the partition selected with
+        has_partition, rather than in a list of the names of every partition.
+        """
+        check.str_param(schedule_name, "schedule_name")
+        check.str_param(cron_schedule, "cron_schedule")
+        check.opt_callable_param(should_execute, "should_execute")
+        check.opt_dict_param(
+            environment_vars, "environment_vars", key_type=str, value_type=str
+        )
+        check.callable_param(partition_selector, "partition_selector")
+        check.opt_str_param(execution_timezone, "execution_timezone")
+
+        def _select(context):
+            check.inst_param(context, "context", ScheduleExecutionContext)
+            selected_partition = partition_selector(context, self)
+            if not selected_partition or not self.has_partition(
+                selected_partition.name
+            ):
+                return None
+            return selected_partition
+
+        def _should_execute_wrapper(context):
+            if not _select(context):
+                return False
+            elif not should_execute:
+                return True
+            else:
+                return should_execute(context)
+
+        def _selected_partition(context):
+            selected_partition = _select(context)
+            if not selected_partition:
+                raise DagsterInvariantViolationError(
+                    "The partition selection function `{selector}` did not return "
+                    "a partition from PartitionSet {partition_set}".format(
+                        selector=getattr(
+                            partition_selector, "__name__", repr(partition_selector)
+                        ),
+                        partition_set=self.name,
+                    )
+                )
+            return selected_partition
+
+        def _run_config_fn_wrapper(context):
+            return self.run_config_for_partition(_selected_partition(context))
+
+        def _tags_fn_wrapper(context):
+            return self.tags_for_partition(_selected_partition(context))
+
+        return PartitionScheduleDefinition(
+            name=schedule_name,
+            cron_schedule=cron_schedule,
+            pipeline_name=self.pipeline_name,
+            run_config_fn=_run_config_fn_wrapper,
+            tags_fn=_tags_fn_wrapper,
+            solid_selection=self.solid_selection,
+            mode=self.mode,
+            should_execute=_should_execute_wrapper,
+            environment_vars=environment_vars,
+            partition_set=self,
+            execution_timezone=execution_timezone,
+        )
+
+
+def minute_partition_selector_fn(delta_fn, fmt):
+    """
+    Like dagster's default partition selector, the partition of the tick's time, but
+    looked up by name rather than in a list of every partition.
+    """
+    check.callable_param(delta_fn, "delta_fn")
+    check.str_param(fmt, "fmt")
+
+    def minute_partition_selector(context, partition_set_def):
+        check.inst_param(context, "context", ScheduleExecutionContext)
+        check.inst_param(
+            partition_set_def, "partition_set_def", MinutePartitionSetDefinition
+        )
+        partitions = partition_set_def.get_partitions()
+        if not context.scheduled_execution_time:
+            return partitions[-1] if partitions else None
+
+        # The tick at a given datetime corresponds to the time for the previous
+        # partition
+        partition_name = delta_fn(context.scheduled_execution_time).strftime(fmt)
+        try:
+            return partitions[partitions.index(partition_name)]
+        except ValueError:
+            return None
+
+    return minute_partition_selector
+
+
+def minute_partition_range(
+    start,
+    end,
+    cron_schedule,
+    step_minutes,
+    fmt,
+    timezone,
+    execution_time_to_partition_fn,
+):
+    """
+    Same partitions as schedule_partition_range, for schedules that run every
+    step_minutes, as MinutePartitions
+    """
+    check.inst_param(start, "start", datetime.datetime)
+    check.opt_inst_param(end, "end", datetime.datetime)
+    check.int_param(step_minutes, "step_minutes")
+
+    if end and start > end:
+        raise DagsterInvariantViolationError(
+            'Selected date range start "{start}" is after date range end "{end}'.format(
+                start=start.strftime(fmt), end=end.strftime(fmt),
+            )
+        )
+
+    def get_minute_partitions():
+        tz = timezone if timezone else pendulum.now().timezone.name
+        _start = (
+            start.in_tz(tz)
+            if isinstance(start, pendulum.Pendulum)
+            else pendulum.instance(start, tz=tz)
+        )
+        if not end:
+            _end = pendulum.now(tz)
+        elif isinstance(end, pendulum.Pendulum):
+            _end = end.in_tz(tz)
+        else:
+            _end = pendulum.instance(end, tz=tz)
+
+        step = step_minutes * 60
+        first = next(
+            schedule_execution_time_iterator(_start.timestamp(), cron_schedule, tz)
+        ).timestamp()
+
+        def partition_timestamp(execution_timestamp):
+            execution_time = pendulum.from_timestamp(execution_timestamp, tz=tz)
+            return execution_time_to_partition_fn(execution_time).timestamp()
+
+        if partition_timestamp(first) < _start.timestamp():
+            first += step
+        last = _end.timestamp() - partition_timestamp(first)
+        count = int(last // step) + 1 if last >= 0 else 0
+        # Leaves out the latest, like schedule_partition_range
+        return MinutePartitions(
+            first, step, max(count - 1, 0), fmt, tz, execution_time_to_partition_fn
+        )
+
+    return get_minute_partitions
+
+
 def schedule_partition_range(
     start, end, cron_schedule, fmt, timezone, execution_time_to_partition_fn,
 ):
@@ -1,9 +1,11 @@
 from dagster import pipeline
 
 from lena_tweets.solids import (
+    compact_tweets,
     get_friends_of_users,
     get_ids_collect_info,
     collect_tweets_of_users,
+    run_collector,
 )
 
 
@@ -25,3 +27,13 @@ def daily_user_scrape():
 @pipeline
 def daily_tweet_scrape():
     collect_tweets_of_users()
+
+
+@pipeline
+def compact_tweet_output():
+    compact_tweets()
+
+
+@pipeline
+def collector():
+    run_collector()
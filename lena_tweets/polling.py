@@ -0,0 +1,53 @@
+"""
+When to next poll a user's timeline, going by how much they post.
+
+Users that post a lot are polled often, so their new tweets don't outgrow what a poll
+can page through, and quiet users are left alone until they are likely to have posted.
+"""
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from lena_tweets.config import (
+    TWEET_POLL_MAX_INTERVAL,
+    TWEET_POLL_MIN_INTERVAL,
+    TWEET_POLL_TARGET,
+    TWEET_RATE_SMOOTHING,
+)
+from lena_tweets.records import TweetRecord
+
+# Shortest stretch of time a rate is worked out over, in hours
+MIN_OBSERVED_HOURS = 1
+
+
+def estimate_tweet_rate(
+    previous_rate: Optional[float],
+    last_polled: Optional[datetime],
+    records: List[TweetRecord],
+) -> float:
+    """
+    Tweets per hour, smoothed over polls.
+
+    The tweets found by a poll are spread over the time since the last poll, or since
+    the oldest of them for a user's first poll.
+    """
+    if last_polled is not None:
+        hours = (datetime.now() - last_polled).total_seconds() / 3600
+    elif records:
+        oldest = min(record.created_at for record in records)
+        hours = (datetime.utcnow() - oldest).total_seconds() / 3600
+    else:
+        hours = MIN_OBSERVED_HOURS
+    observed = len(records) / max(hours, MIN_OBSERVED_HOURS)
+    if previous_rate is None:
+        return observed
+    return TWEET_RATE_SMOOTHING * observed + (1 - TWEET_RATE_SMOOTHING) * previous_rate
+
+
+def next_poll_due(rate: float, now: datetime) -> datetime:
+    """When a user posting rate tweets per hour will have about TWEET_POLL_TARGET"""
+    if rate > 0:
+        interval = TWEET_POLL_TARGET / rate * 3600
+    else:
+        interval = TWEET_POLL_MAX_INTERVAL
+    interval = min(max(interval, TWEET_POLL_MIN_INTERVAL), TWEET_POLL_MAX_INTERVAL)
+    return now + timedelta(seconds=interval)
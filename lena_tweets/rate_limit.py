@@ -0,0 +1,161 @@
+"""
+Keeps track of the rate limit budget left on every credential for every endpoint used,
+so that calls can be spread over all configured credentials.
+"""
+import threading
+import time
+from typing import Dict, List, Set, Tuple
+
+import tweepy
+
+from lena_tweets.config import CREDS
+
+# Requests per 15 minute window with user authentication. Only used until twitter
+# reports the real numbers through the x-rate-limit-* response headers.
+ENDPOINT_LIMITS = {
+    "friends/ids": 15,
+    "friends/list": 15,
+    "statuses/user_timeline": 900,
+    "users/lookup": 900,
+    "users/show": 900,
+}
+WINDOW_SECONDS = 15 * 60
+# Twitter's clock and ours don't agree to the second
+RESET_MARGIN_SECONDS = 2
+
+
+class _Budget:
+    __slots__ = ("limit", "remaining", "reset")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.remaining = limit
+        # Epoch seconds at which the window resets, None if not known yet
+        self.reset = None
+
+    def refresh(self, now: float):
+        if self.reset is not None and now >= self.reset:
+            self.remaining = self.limit
+            self.reset = None
+
+
+class CredentialPool:
+    """
+    Remaining budget and reset time per (credential, endpoint).
+
+    Calls take budget with `acquire`, which hands out the credential with the most
+    budget left, and report back what twitter said with `update` or `exhaust`.
+    Credentials twitter rejects are taken out with `disable`.
+    """
+
+    def __init__(self, n_credentials: int, limits: Dict[str, int] = ENDPOINT_LIMITS):
+        self.n_credentials = n_credentials
+        self.limits = limits
+        self._budgets: Dict[Tuple[int, str], _Budget] = {}
+        self._disabled: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def _budget(self, cred_id: int, endpoint: str) -> _Budget:
+        key = (cred_id, endpoint)
+        if key not in self._budgets:
+            self._budgets[key] = _Budget(self.limits.get(endpoint, 15))
+        return self._budgets[key]
+
+    def _endpoint_budgets(self, endpoint: str) -> List[Tuple[int, _Budget]]:
+        if not self.n_credentials:
+            raise ValueError(
+                "Fill in with at least 1 set of twitter application credentials to use module"
+            )
+        if len(self._disabled) == self.n_credentials:
+            raise ValueError(
+                "Twitter rejected every configured credential, check them in config"
+            )
+        now = time.time()
+        budgets = []
+        for cred_id in range(self.n_credentials):
+            if cred_id in self._disabled:
+                continue
+            budget = self._budget(cred_id, endpoint)
+            budget.refresh(now)
+            budgets.append((cred_id, budget))
+        return budgets
+
+    def acquire(self, endpoint: str, wait: bool = False) -> int:
+        """
+        Takes one call of budget for endpoint and returns the credential to use for it.
+
+        If no credential has any budget left, either sleeps until the earliest reset
+        or raises tweepy.RateLimitError.
+        """
+        while True:
+            with self._lock:
+                cred_id, budget = max(
+                    self._endpoint_budgets(endpoint), key=lambda b: b[1].remaining
+                )
+                if budget.remaining > 0:
+                    budget.remaining -= 1
+                    if budget.reset is None:
+                        # The window starts with the first call made in it
+                        budget.reset = time.time() + WINDOW_SECONDS
+                    return cred_id
+            if not wait:
+                raise tweepy.RateLimitError(
+                    f"No credential has rate limit budget left for {endpoint}"
+                )
+            time.sleep(self.seconds_until_available(endpoint))
+
+    def update(self, cred_id: int, endpoint: str, response=None):
+        """
+        Overwrites the budget with what twitter reported in the x-rate-limit-* headers.
+        """
+        headers = getattr(response, "headers", None) or {}
+        remaining = headers.get("x-rate-limit-remaining")
+        reset = headers.get("x-rate-limit-reset")
+        limit = headers.get("x-rate-limit-limit")
+        with self._lock:
+            budget = self._budget(cred_id, endpoint)
+            if limit is not None:
+                budget.limit = int(limit)
+            if remaining is not None:
+                budget.remaining = int(remaining)
+            if reset is not None:
+                budget.reset = int(reset) + RESET_MARGIN_SECONDS
+            elif budget.reset is None:
+                budget.reset = time.time() + WINDOW_SECONDS
+
+    def exhaust(self, cred_id: int, endpoint: str, response=None):
+        """
+        Marks the credential as out of budget for endpoint, i.e. after a rate limit error.
+        """
+        self.update(cred_id, endpoint, response)
+        with self._lock:
+            self._budget(cred_id, endpoint).remaining = 0
+
+    def disable(self, cred_id: int):
+        """Stops handing out the credential, i.e. once its token was revoked"""
+        with self._lock:
+            self._disabled.add(cred_id)
+
+    def seconds_until_available(self, endpoint: str) -> float:
+        """
+        Seconds until at least one credential has budget for endpoint again.
+        """
+        with self._lock:
+            budgets = [b for _, b in self._endpoint_budgets(endpoint)]
+        if any(b.remaining > 0 for b in budgets):
+            return 0
+        return max(min(b.reset for b in budgets) - time.time(), 0)
+
+    def wait_for_budget(self, endpoint: str, log=None):
+        """
+        Sleeps until the earliest reset among all credentials for endpoint.
+        """
+        seconds = self.seconds_until_available(endpoint)
+        if seconds and log:
+            log.error(
+                f"Rate limit reached for {endpoint}. Sleeping {seconds:.0f}s until reset"
+            )
+        time.sleep(seconds)
+
+
+credential_pool = CredentialPool(len(CREDS))
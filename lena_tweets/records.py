@@ -0,0 +1,60 @@
+"""
+Compact records of the fields that are stored, pulled straight out of the api's json.
+
+These are what gets written out, rather than full tweepy models, since a tweepy Status
+builds a whole object graph (including its author's User) for every tweet.
+"""
+from datetime import datetime
+from operator import attrgetter
+from typing import Iterable, List
+
+MONTHS = {
+    month: number
+    for number, month in enumerate(
+        "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec".split(), start=1
+    )
+}
+
+
+def parse_created_at(created_at: str) -> datetime:
+    """
+    Parses twitter's "Wed Oct 10 20:19:24 +0000 2018" into a naive UTC datetime, like
+    tweepy does but without going through strptime.
+    """
+    _, month, day, clock, _, year = created_at.split(" ")
+    hour, minute, second = clock.split(":")
+    return datetime(
+        int(year), MONTHS[month], int(day), int(hour), int(minute), int(second)
+    )
+
+
+class TweetRecord:
+    """
+    A stored tweet. To store more or other fields, add them to __slots__ and
+    from_json, in the order they should be written out in.
+    """
+
+    __slots__ = ("user_id", "id", "text", "created_at")
+
+    def __init__(self, user_id: int, id: int, text: str, created_at: datetime):
+        self.user_id = user_id
+        self.id = id
+        self.text = text
+        self.created_at = created_at
+
+    @classmethod
+    def from_json(cls, user_id: int, tweet: dict) -> "TweetRecord":
+        return cls(
+            user_id, tweet["id"], tweet["text"], parse_created_at(tweet["created_at"])
+        )
+
+    def as_row(self) -> tuple:
+        return _tweet_row(self)
+
+
+_tweet_row = attrgetter(*TweetRecord.__slots__)
+
+
+def tweet_records(user_id: int, tweets: Iterable[dict]) -> List[TweetRecord]:
+    user_id = int(user_id)
+    return [TweetRecord.from_json(user_id, tweet) for tweet in tweets]
@@ -4,10 +4,16 @@ from pathlib import Path
 import pandas as pd
 from dagster import repository
 
-from lena_tweets.config import TIMESTAMP_FORMAT
-from lena_tweets.database import connection_manager, Tracker
+from lena_tweets.config import (
+    DAILY_TWEETS_CONCURRENCY,
+    TIMESTAMP_FORMAT,
+    TWEET_HISTORY_CONCURRENCY,
+)
+from lena_tweets.database import connection_manager, tweets_due_at, Tracker
 from lena_tweets.partition_schedule import minute_schedule
 from lena_tweets.pipelines import (
+    collector,
+    compact_tweet_output,
     daily_user_scrape,
     daily_tweet_scrape,
     kick_off_study,
@@ -29,12 +35,18 @@ def queue_people(_):
         )
         & (Tracker.participant == True)
     )
-    return not_checked_today.count() > 0
+    return not_checked_today.exists()
+
+
+@connection_manager()
+def tweets_due(_):
+    """Returns whether any user is due a poll for new tweets"""
+    return Tracker.select().where(tweets_due_at <= datetime.now()).exists()
 
 
 @connection_manager()
 def outstanding_tweet_history(_):
-    return bool(Tracker.select().where(Tracker.latest_tweet_id.is_null()).count())
+    return Tracker.select().where(Tracker.history_retrieved.is_null()).exists()
 
 
 @minute_schedule(
@@ -57,12 +69,16 @@ def my_three_minute_schedule(date):
     pipeline_name="daily_tweet_scrape",
     cron_schedule="*/3 * * * *",
     start_date=datetime(2020, 12, today_day),
+    should_execute=tweets_due,
 )
 def my_three_minute_schedule_tweet(date):
     return {
         "solids": {
             "collect_tweets_of_users": {
-                "config": {"timestamp": date.strftime(TIMESTAMP_FORMAT)},
+                "config": {
+                    "timestamp": date.strftime(TIMESTAMP_FORMAT),
+                    "concurrency": DAILY_TWEETS_CONCURRENCY,
+                },
             },
         }
     }
@@ -78,13 +94,25 @@ def my_three_minute_schedule_tweet_history(date):
     return {
         "solids": {
             "collect_tweets_of_users": {
-                "config": {"timestamp": date.strftime(TIMESTAMP_FORMAT)},
+                "config": {
+                    "timestamp": date.strftime(TIMESTAMP_FORMAT),
+                    "concurrency": TWEET_HISTORY_CONCURRENCY,
+                },
                 "inputs": {"all_tweets": True},
             },
         }
     }
 
 
+@minute_schedule(
+    pipeline_name="compact_tweet_output",
+    start_date=datetime(2020, 12, today_day),
+    cron_schedule="0 3 * * *",
+)
+def my_daily_schedule_compact_tweets(date):
+    return {}
+
+
 @repository(name="lena_tweets")
 def repo():
     return [
@@ -95,4 +123,7 @@ def repo():
         kick_off_study,
         tweet_history,
         my_three_minute_schedule_tweet_history,
+        compact_tweet_output,
+        my_daily_schedule_compact_tweets,
+        collector,
     ]
@@ -0,0 +1,164 @@
+"""
+Retrying of failed twitter calls with exponential backoff.
+
+Errors are told apart by the twitter error code and HTTP status of the response,
+rather than by the text of the error.
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from typing import Dict, Optional
+
+import tweepy
+
+from lena_tweets.config import RETRY_BASE_DELAY, RETRY_MAX_DELAY, RETRY_TIME_BUDGET
+
+RATE_LIMITED = "rate_limited"
+NOT_AUTHORIZED = "not_authorized"
+FATAL = "fatal"
+RETRYABLE = "retryable"
+
+# https://developer.twitter.com/en/support/twitter-api/error-troubleshooting
+RATE_LIMIT_CODES = {88}
+NOT_AUTHORIZED_CODES = {179}
+# Could not authenticate, invalid or expired token, bad authentication data, account
+# locked. Twitter sends these with a 401, but they are about the credential, not the
+# user whose data was asked for.
+BAD_CREDENTIAL_CODES = {32, 89, 215, 326}
+# No user matches, page does not exist, user not found, user suspended, blocked
+FATAL_CODES = {17, 34, 50, 63, 136} | BAD_CREDENTIAL_CODES
+# Over capacity, internal error
+RETRYABLE_CODES = {130, 131}
+
+_log = logging.getLogger(__name__)
+
+_retry_counts = Counter()
+_retry_counts_lock = threading.Lock()
+
+
+def _api_codes(exc: tweepy.TweepError) -> set:
+    api_code = getattr(exc, "api_code", None)
+    if api_code is None:
+        return set()
+    if isinstance(api_code, list):
+        return set(api_code)
+    return {api_code}
+
+
+def classify_error(exc: tweepy.TweepError) -> str:
+    """
+    Whether a failed call was rate limited, not authorized, can't succeed or is worth
+    trying again.
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(response, "status_code", None)
+    codes = _api_codes(exc)
+
+    if isinstance(exc, tweepy.RateLimitError) or codes & RATE_LIMIT_CODES:
+        return RATE_LIMITED
+    if status in (420, 429):
+        return RATE_LIMITED
+    if codes & NOT_AUTHORIZED_CODES:
+        return NOT_AUTHORIZED
+    if codes & RETRYABLE_CODES:
+        return RETRYABLE
+    if codes & FATAL_CODES:
+        return FATAL
+    if status == 401 and not codes:
+        # Protected accounts answer 401 without an error code
+        return NOT_AUTHORIZED
+    if status is None or status >= 500:
+        # No response at all means the request didn't get through
+        return RETRYABLE
+    return FATAL
+
+
+def is_not_authorized(exc: tweepy.TweepError) -> bool:
+    return classify_error(exc) == NOT_AUTHORIZED
+
+
+def is_fatal(exc: tweepy.TweepError) -> bool:
+    """Whether the call can't succeed, i.e. the user was deleted or suspended"""
+    return classify_error(exc) == FATAL
+
+
+def is_bad_credential(exc: tweepy.TweepError) -> bool:
+    """Whether twitter rejected the credential the call was made with"""
+    return bool(_api_codes(exc) & BAD_CREDENTIAL_CODES)
+
+
+def backoff_delay(
+    try_number: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY
+) -> float:
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * 2 ** try_number))
+
+
+def retry_counts() -> Dict[str, int]:
+    """Retries made per endpoint so far in this process"""
+    with _retry_counts_lock:
+        return dict(_retry_counts)
+
+
+def _count_retry(endpoint: str):
+    with _retry_counts_lock:
+        _retry_counts[endpoint] += 1
+
+
+def retry_decorator(
+    total_retry_number: int = 8,
+    endpoint: Optional[str] = None,
+    time_budget: float = RETRY_TIME_BUDGET,
+):
+    """
+    Retries the decorated twitter call on retryable errors, up to total_retry_number
+    tries and for at most time_budget seconds, sleeping with exponential backoff and
+    jitter in between. Rate limit, authorization and other errors are raised straight
+    away.
+
+    Logs to the log passed as first argument or `log` keyword, if there is one.
+    """
+
+    def fix_retry_decorator(twitter_func):
+        name = endpoint or twitter_func.__name__
+
+        @wraps(twitter_func)
+        def wrapper(*args, **kwargs):
+            log = kwargs.get("log") or (args[0] if args else None)
+            if not hasattr(log, "warning"):
+                log = _log
+            deadline = time.monotonic() + time_budget
+            try_number = 0
+            while True:
+                try:
+                    return twitter_func(*args, **kwargs)
+                except tweepy.error.TweepError as exc:
+                    kind = classify_error(exc)
+                    if kind == RATE_LIMITED:
+                        log.error(
+                            "tweepy.RateLimitError, raising, since this gets handled above."
+                        )
+                        raise
+                    if kind != RETRYABLE:
+                        raise
+                    try_number += 1
+                    delay = backoff_delay(try_number)
+                    if (
+                        try_number >= total_retry_number
+                        or time.monotonic() + delay > deadline
+                    ):
+                        log.warning(f"TweepError on {name}. No more retries left")
+                        raise
+                    _count_retry(name)
+                    log.warning(
+                        f"TweepError on {name}: {exc}\nWill retry in {delay:.1f}s, "
+                        f"{total_retry_number - try_number} more times at most."
+                    )
+                    time.sleep(delay)
+
+        return wrapper
+
+    return fix_retry_decorator
@@ -1,175 +1,250 @@
+import logging
 import time
-from datetime import datetime
-from functools import partial
-from typing import List, Optional, Union, Tuple
+from collections import OrderedDict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from typing import Callable, Iterable, Iterator, List, Optional, Union, Tuple
 
 import tweepy
 from tweepy import User, Status
 
-from lena_tweets.auth import authenticate
+from lena_tweets.client import get_client
+from lena_tweets.config import (
+    LOOKUP_CONCURRENCY,
+    PROFILE_CACHE_SIZE,
+    PROFILE_CACHE_TTL,
+)
+from lena_tweets.rate_limit import credential_pool
+from lena_tweets.retry import is_bad_credential, is_not_authorized, retry_decorator
 
+_log = logging.getLogger(__name__)
 
-def retry_decorator(total_retry_number=8):
-    def fix_retry_decorator(twitter_func):
-        def wrapper(*args, try_number=0, **kwargs):
-            try:
-                return twitter_func(*args, **kwargs)
-            except tweepy.RateLimitError as exc:
-                args[0].error(
-                    "tweepy.RateLimitError, raising, since this gets handled above."
-                )
-                raise
-            except tweepy.error.TweepError as exc:
-                if "Not authorized" in str(exc) or "Sorry, that page does not exist." in str(exc):
-                    # No point retrying these
-                    raise
-                try_number += 1
-                if try_number < total_retry_number:
-                    args[0].warning(
-                        f"TweepError {exc}.\nWill retry {total_retry_number - try_number} more times."
-                    )
-                    return wrapper(*args, try_number=try_number, **kwargs)
-                else:
-                    args[0].warning("TweepError. No more retries left")
-                    raise
-
-        return wrapper
-
-    return fix_retry_decorator
 
-
-@retry_decorator()
-def _get_data_points(log, func, count: int = 200, cursor: int = -1):
+def _call_api(endpoint: str, method: str, *args, wait: bool = False, **kwargs):
     """
-    Gets paginated endpoint where the return has format
-    new_data, (cursor x, cursor y)
+    Calls api method with a credential that still has budget for endpoint.
 
-    Returns list of datapoints
+    If twitter says the credential is rate limited after all, it is marked as such
+    and the call is made again with the next credential that has budget. The same goes
+    for credentials twitter rejects, which aren't used again.
     """
-    datapoints = []
-
-    while cursor != 0:
+    while True:
+        cred_id = credential_pool.acquire(endpoint, wait=wait)
+        api = get_client(cred_id)
         try:
-            new_data, (_, cursor) = func(count=count, cursor=cursor)
+            result = getattr(api, method)(*args, **kwargs)
         except tweepy.RateLimitError as exc:
-            if cursor == -1:
-                # Never return -1 due to error so that that is a special case for
-                # no friends
-                cursor = None
-            break
-        datapoints.extend(new_data)
-        log.info(f"Got {len(new_data)} datapoints")
-
-    return datapoints, cursor
+            credential_pool.exhaust(cred_id, endpoint, exc.response)
+            continue
+        except tweepy.error.TweepError as exc:
+            credential_pool.update(cred_id, endpoint, exc.response)
+            if is_bad_credential(exc):
+                _log.error(f"Twitter rejected credential {cred_id}, dropping it: {exc}")
+                credential_pool.disable(cred_id)
+                continue
+            raise
+        credential_pool.update(cred_id, endpoint, api.last_response)
+        return result
 
 
 def get_friends(
-    log, screen_name: str, count: int = 200, cursor: int = -1
-) -> Tuple[User, List[User]]:
+    log, screen_name: str, unseen: Callable[[List[int]], List[int]] = list
+) -> Tuple[User, List[int], List[User]]:
     """
-    Generates list of people that twitter user with particular handle follows.
+    Gets twitter user with particular handle, the ids of everyone they follow and the
+    profiles of those followed that unseen returns, out of all their ids.
+
+    Follow lists come from friends/ids at 5000 per call, rather than friends/list at
+    200, and only unknown profiles are hydrated with users/lookup.
     """
-    api = authenticate()
     log.info(f"In get friends")
-    user = api.get_user(screen_name)
+    user = _call_api("users/show", "get_user", screen_name)
     log.info(f"Fetched user {user.id}")
 
     try:
-        friends, cursor = _get_data_points(
-            log, user.friends, count=count, cursor=cursor
-        )
+        friends_ids = get_friends_ids(log, user.id)
     except tweepy.error.TweepError as exc:
-        if "Not authorized" in str(exc):
+        if is_not_authorized(exc):
             log.warning(str(exc))
             log.warning(f"WARNING - NO PERMISSIONS TO VIEW friends for {screen_name}")
-            friends = []
+            friends_ids = []
         else:
             raise
-    if cursor != 0 and cursor != -1:
-        cursor = cursor or -1
-        # This means that while loop didn't break - more than 15 requests necessary
-        # for friend. So, recursively get more friends starting from where we left off
-        log.error("Rate limit reached. Sleeping for the next round 3 minutes")
-        minute = datetime.now().minute
-        # Wait for next code...
-        while datetime.now().minute == minute or datetime.now().minute % 3 != 0:
-            time.sleep(5)
-        # Extend with more friends - ignore original uuserr...
-        friends.extend(get_friends(log, screen_name, count=count, cursor=cursor)[1])
-    log.info(f"Got {len(friends)} new friends")
-    return user, friends
 
+    new_ids = unseen(friends_ids)
+    friends = lookup_users(log, new_ids)
+    log.info(f"Got {len(friends_ids)} friends, {len(friends)} new")
+    return user, friends_ids, friends
 
-def lookup_users(
-    log, ids: List[Union[int, str]], screen_name: bool = False
-) -> List[User]:
-    users = []
+
+class ProfileCache:
+    """
+    Looked up profiles by id and lower case screen name, kept for ttl seconds and at
+    most maxsize of them, evicting the oldest first.
+    """
+
+    def __init__(
+        self, maxsize: int = PROFILE_CACHE_SIZE, ttl: int = PROFILE_CACHE_TTL
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key: (expiry timestamp, user), oldest first
+        self._profiles = OrderedDict()
+
+    def get(self, key: Union[int, str]) -> Optional[User]:
+        entry = self._profiles.get(key)
+        if entry is None:
+            return None
+        expires, user = entry
+        if expires < time.time():
+            del self._profiles[key]
+            return None
+        return user
+
+    def add(self, user: User):
+        expires = time.time() + self.ttl
+        for key in (user.id, user.screen_name.lower()):
+            self._profiles.pop(key, None)
+            self._profiles[key] = (expires, user)
+        while len(self._profiles) > self.maxsize:
+            self._profiles.popitem(last=False)
+
+
+profile_cache = ProfileCache()
+
+
+def iter_lookup_users(
+    log, ids: Iterable[Union[int, str]], screen_name: bool = False
+) -> Iterator[User]:
+    """
+    Yields the users with ids (or screen names) as they are looked up.
+
+    Duplicates are dropped and cached profiles are yielded without a call. The rest
+    is looked up in batches of 100, with LOOKUP_CONCURRENCY batches in flight at once,
+    so only that many batches of results are held at a time.
+    """
     log.info(f"In lookup users")
-    for i in range(len(ids) // 100 + 1):
-        intex_lower, index_upper = i * 100, (i + 1) * 100
-        users.extend(
-            lookup_100_friends(
-                log, ids[intex_lower:index_upper], screen_name=screen_name
+    to_fetch = []
+    keys = (key.lower() if screen_name else int(key) for key in ids)
+    for key in dict.fromkeys(keys):
+        user = profile_cache.get(key)
+        if user is None:
+            to_fetch.append(key)
+        else:
+            yield user
+
+    with ThreadPoolExecutor(max_workers=LOOKUP_CONCURRENCY) as executor:
+        in_flight = set()
+        for i in range(0, len(to_fetch), 100):
+            batch = to_fetch[i : i + 100]
+            in_flight.add(
+                executor.submit(lookup_100_friends, log, batch, screen_name=screen_name)
             )
-        )
-        log.info(f"Extended with {index_upper - intex_lower} users")
+            if len(in_flight) >= LOOKUP_CONCURRENCY:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                yield from _add_to_profile_cache(log, done)
+        yield from _add_to_profile_cache(log, as_completed(in_flight))
 
-    return users
 
+def _add_to_profile_cache(log, futures: Iterable[Future]) -> Iterator[User]:
+    for future in futures:
+        users = future.result()
+        log.info(f"Looked up {len(users)} users")
+        for user in users:
+            profile_cache.add(user)
+            yield user
 
-@retry_decorator()
+
+def lookup_users(
+    log, ids: List[Union[int, str]], screen_name: bool = False
+) -> List[User]:
+    return list(iter_lookup_users(log, ids, screen_name=screen_name))
+
+
+@retry_decorator(endpoint="users/lookup")
 def lookup_100_friends(
     log, ids: List[Union[int, str]], screen_name: bool = False
 ) -> List[User]:
-    api = authenticate()
     if screen_name:
-        return api.lookup_users(screen_names=ids)
-    return api.lookup_users(user_ids=ids)
+        return _call_api("users/lookup", "lookup_users", screen_names=ids)
+    return _call_api("users/lookup", "lookup_users", user_ids=ids)
+
+
+@retry_decorator(endpoint="friends/ids")
+def _get_friends_ids_page(log, handle: Union[int, str], count: int, cursor: int):
+    return _call_api("friends/ids", "friends_ids", handle, count=count, cursor=cursor)
 
 
-@retry_decorator()
-def get_friends_ids(log, handle: str, count: int = 5000, cursor: int = -1) -> List[int]:
+def iter_friends_ids_pages(
+    log, handle: Union[int, str], cursor: int = -1, count: int = 5000
+) -> Iterator[Tuple[List[int], int]]:
     """
-    Generates list of ids people that twitter user wih particular handle follows.
+    Yields the ids of people that twitter user with particular handle follows a page
+    at a time, starting from cursor, along with the cursor of the page after, which is
+    0 after the last page. Only a page is held at a time, and a walk cut short can be
+    carried on from the last cursor yielded.
+
+    Raises tweepy.RateLimitError when no credential has budget for the next page.
     """
-    log.info(f"Getting friends ids for {handle}")
+    log.info(f"Getting friends ids for {handle} from cursor {cursor}")
+    while cursor != 0:
+        ids, (_, cursor) = _get_friends_ids_page(log, handle, count, cursor)
+        log.info(f"Got {len(ids)} friends ids")
+        yield ids, cursor
 
-    api = authenticate()
-    friends, cursor = _get_data_points(
-        log, partial(api.friends_ids, handle), count=count, cursor=cursor
-    )
 
-    if cursor != 0 and cursor != -1:
-        cursor = cursor or -1
-        # This means that while loop didn't break - more than 15 requests necessary
-        # for friend. So, recursively get more friends starting from where we left off
-        log.error("Rate limit reached. Sleeping for the next round 3 minutes")
-        minute = datetime.now().minute
-        # Wait for next code...
-        while datetime.now().minute == minute or datetime.now().minute % 3 != 0:
-            time.sleep(5)
-        # Extend with more friends - ignore original uuserr...
-        friends.extend(get_friends_ids(log, screen_name, count=count, cursor=cursor)[1])
+def get_friends_ids(log, handle: Union[int, str], count: int = 5000) -> List[int]:
+    """
+    Returns the ids of people that twitter user with particular handle follows, waiting
+    for rate limit budget and carrying on from the same page if it runs out part way.
+    """
+    friends = []
+    cursor = -1
+    while cursor != 0:
+        try:
+            for ids, cursor in iter_friends_ids_pages(log, handle, cursor, count):
+                friends.extend(ids)
+        except tweepy.RateLimitError:
+            credential_pool.wait_for_budget("friends/ids", log)
 
     log.info(f"{len(friends)} friends")
 
     return friends
 
 
-@retry_decorator()
+@retry_decorator(endpoint="statuses/user_timeline")
 def get_user_tweets(
-    log, user_id: int, since_id: Optional[int] = None, count: int = 200, wait=True
-) -> List[Status]:
+    log,
+    user_id: int,
+    since_id: Optional[int] = None,
+    max_id: Optional[int] = None,
+    count: int = 200,
+    wait=True,
+    raw: bool = False,
+) -> Union[List[Status], List[dict]]:
     """
-    Returns tweets of a user
+    Returns tweets of a user, as json if raw
     """
-    api = authenticate(wait=wait)
     log.info("Getting user tweets")
 
     try:
-        tweets = api.user_timeline(user_id=user_id, since_id=since_id, count=count)
+        tweets = _call_api(
+            "statuses/user_timeline",
+            "user_timeline",
+            user_id=user_id,
+            since_id=since_id,
+            max_id=max_id,
+            count=count,
+            wait=wait,
+            raw=raw,
+        )
     except tweepy.error.TweepError as exc:
-        if "Not authorized" in str(exc):
+        if is_not_authorized(exc):
             log.warning(str(exc))
             log.warning(f"WARNING - NO PERMISSIONS TO VIEW user_timeline for {user_id}")
             tweets = []
@@ -179,67 +254,81 @@ def get_user_tweets(
     return tweets
 
 
-@retry_decorator()
-def _get_tweets(log, user_id: int, latest_tweet_id: int, count=200) -> List[Status]:
-    api = authenticate()
-
-    latest_tweets = api.user_timeline(
-        user_id=user_id, max_id=latest_tweet_id, count=count
-    )
-    timeout = 0
-    while not latest_tweets:
-        log.info("Latest tweets is empty")
-        if timeout > 20:
-            return []
-        timeout += 1
-        latest_tweets = api.user_timeline(
-            user_id=user_id, max_id=latest_tweet_id, count=count
-        )
-
-    return latest_tweets
-
-
-@retry_decorator(2)
-def get_all_most_recent_tweets(log, user_id: int) -> List[Status]:
+def get_new_tweets(
+    log, user_id: int, since_id: Optional[int] = None, count: int = 200, raw=False
+) -> Union[List[Status], List[dict]]:
     """
-    Returns all 3200 retreivable tweets of a user.
+    Returns all tweets of a user newer than since_id, newest first, paging back until
+    it reaches since_id so that users who posted more than a page since are not cut
+    short. Without since_id, returns the latest page.
     """
+    if since_id is None:
+        return get_user_tweets(log, user_id, count=count, raw=raw)
 
     tweets = []
-    latest_tweet_id = None
-
-    log.info(f"Getting most recent tweets for user {user_id}")
-
-    api = authenticate()
-    try:
-        latest_tweets = api.user_timeline(
-            user_id=user_id, max_id=latest_tweet_id, count=200
+    max_id = None
+    while True:
+        # Asks for since_id itself too, getting it back shows there is no gap left
+        page = get_user_tweets(
+            log, user_id, since_id=since_id - 1, max_id=max_id, count=count, raw=raw
         )
-        timeout = 0
-        while not latest_tweets:
-            log.info("Latest tweets is empty")
-            if timeout > 2:
-                return []
-            timeout += 1
-            latest_tweets = api.user_timeline(
-                user_id=user_id, max_id=latest_tweet_id, count=200
-            )
+        new = [tweet for tweet in page if _tweet_id(tweet) > since_id]
+        tweets.extend(new)
+        if not page or len(new) < len(page):
+            return tweets
+        log.info(f"More than {len(tweets)} new tweets for user {user_id}, paging on")
+        max_id = _tweet_id(page[-1]) - 1
+
+
+def _tweet_id(tweet: Union[Status, dict]) -> int:
+    return tweet["id"] if isinstance(tweet, dict) else tweet.id
+
+
+@retry_decorator(endpoint="statuses/user_timeline")
+def _get_tweets(
+    log, user_id: int, max_id: Optional[int] = None, count=200, raw: bool = False
+) -> Union[List[Status], List[dict]]:
+    return _call_api(
+        "statuses/user_timeline",
+        "user_timeline",
+        user_id=user_id,
+        max_id=max_id,
+        count=count,
+        raw=raw,
+    )
 
-    except tweepy.error.TweepError as exc:
-        if "Not authorized" in str(exc):
-            log.warning(str(exc))
-            log.warning(f"WARNING - NO PERMISSIONS TO VIEW user_timeline for {user_id}")
-            return []
-        else:
-            raise
 
-    tweets.extend(latest_tweets)
+def iter_timeline_pages(
+    log, user_id: int, max_id: Optional[int] = None, count: int = 200, raw=False
+) -> Iterator[Union[List[Status], List[dict]]]:
+    """
+    Yields the tweets of a user a page at a time, newest first, starting from max_id.
+    Pages are lists of tweet json rather than Status objects if raw.
+
+    Only the failing page is retried on errors, and the walk stops at the first empty
+    page, which is the end of the (up to 3200) tweets twitter gives out.
+    """
+    log.info(f"Getting most recent tweets for user {user_id} from max_id {max_id}")
 
-    while latest_tweets and latest_tweets[-1].id != latest_tweet_id:
-        log.debug("More tweets to fetch")
-        latest_tweet_id = latest_tweets[-1].id
-        latest_tweets = _get_tweets(log, user_id, latest_tweets[-1].id, count=200)
+    while True:
+        try:
+            tweets = _get_tweets(log, user_id, max_id=max_id, count=count, raw=raw)
+        except tweepy.error.TweepError as exc:
+            if is_not_authorized(exc):
+                log.warning(str(exc))
+                log.warning(
+                    f"WARNING - NO PERMISSIONS TO VIEW user_timeline for {user_id}"
+                )
+                return
+            raise
+        if not tweets:
+            return
+        yield tweets
+        max_id = _tweet_id(tweets[-1]) - 1
 
-        tweets.extend(latest_tweets[1:])
 
-    return tweets
+def get_all_most_recent_tweets(log, user_id: int) -> List[Status]:
+    """
+    Returns all 3200 retreivable tweets of a user.
+    """
+    return [tweet for page in iter_timeline_pages(log, user_id) for tweet in page]
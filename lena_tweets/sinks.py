@@ -0,0 +1,208 @@
+"""
+Where collected tweets are written out to.
+
+Sinks take records along with what to do once they are written out, like moving the
+tracker on past them, and only do that once the records are on disk, so the tracker
+never gets ahead of what is written out.
+"""
+import csv
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from lena_tweets.config import (
+    CSV_BUFFER_SIZE,
+    OUTPUT_FORMAT,
+    PARQUET_COMPRESSION,
+    PARQUET_DIR,
+    PARQUET_FLUSH_INTERVAL,
+    PARQUET_ROW_GROUP_SIZE,
+    PARQUET_USER_SHARDS,
+    SINK_FLUSH_INTERVAL,
+)
+from lena_tweets.records import TweetRecord
+
+OnWritten = Optional[Callable[[], None]]
+
+
+class TweetSink(ABC):
+    """
+    Buffers records and writes them out once buffer_size are buffered, once
+    flush_interval seconds have passed since the last write out, and when closed.
+
+    Each write can come with what to do once its records are written out, which is
+    done in order after the records are synced to disk. Can be used as a context
+    manager that closes it.
+    """
+
+    def __init__(self, buffer_size: int, flush_interval: float):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        # Records written out so far
+        self.n_written = 0
+        self._records = []
+        self._on_written = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, records: List[TweetRecord], on_written: OnWritten = None):
+        with self._lock:
+            self._records.extend(records)
+            if on_written is not None:
+                self._on_written.append(on_written)
+            if len(self._records) >= self.buffer_size or self._flush_due():
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def flush_if_due(self, within: float = 0):
+        """
+        Writes out what is buffered if flush_interval seconds will have passed since
+        the last write out within seconds from now
+        """
+        with self._lock:
+            if self._flush_due(within):
+                self._flush()
+
+    def _flush_due(self, within: float = 0) -> bool:
+        return time.monotonic() + within - self._last_flush >= self.flush_interval
+
+    def close(self):
+        self.flush()
+
+    def _flush(self):
+        if self._records:
+            self._write_out(self._records)
+            self.n_written += len(self._records)
+            self._records = []
+        self._last_flush = time.monotonic()
+
+        on_written, self._on_written = self._on_written, []
+        for callback in on_written:
+            callback()
+
+    @abstractmethod
+    def _write_out(self, records: List[TweetRecord]):
+        """Writes records out and syncs them to disk"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CsvSink(TweetSink):
+    """Appends records to a csv file, kept open until the sink is closed"""
+
+    def __init__(self, path: str, buffer_size: int = CSV_BUFFER_SIZE):
+        super().__init__(buffer_size, SINK_FLUSH_INTERVAL)
+        self.path = Path(path)
+        self._file = None
+        self._writer = None
+
+    def _write_out(self, records: List[TweetRecord]):
+        if self._file is None:
+            self._file = open(self.path, "a", newline="")
+            self._writer = csv.writer(self._file, lineterminator="\n")
+            if not self._file.tell():
+                self._writer.writerow(TweetRecord.__slots__)
+        self._writer.writerows(record.as_row() for record in records)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        super().close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ParquetSink(TweetSink):
+    """
+    Writes records out as compressed parquet files, one per user shard, under
+    PARQUET_DIR/name/date=day/shard=n/.
+    """
+
+    def __init__(self, name: str, day: date):
+        # Every write out makes a file per shard, so they are written out less often
+        super().__init__(PARQUET_ROW_GROUP_SIZE, PARQUET_FLUSH_INTERVAL)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "pyarrow is needed for OUTPUT_FORMAT = 'parquet', pip install pyarrow"
+            )
+        self._pa = pa
+        self._pq = pq
+        self._schema = pa.schema(
+            [
+                ("user_id", pa.int64()),
+                ("id", pa.int64()),
+                ("text", pa.string()),
+                ("created_at", pa.timestamp("s")),
+            ]
+        )
+        self.directory = Path(PARQUET_DIR) / name / f"date={day.isoformat()}"
+
+    def _write_out(self, records: List[TweetRecord]):
+        shards = defaultdict(list)
+        for record in records:
+            shards[record.user_id % PARQUET_USER_SHARDS].append(record)
+        for shard, shard_records in shards.items():
+            shard_records.sort(key=lambda record: (record.user_id, record.id))
+            self._write_file(shard, shard_records)
+
+    def _write_file(self, shard: int, records: List[TweetRecord]):
+        pa = self._pa
+        table = pa.Table.from_arrays(
+            [
+                pa.array([record.user_id for record in records], pa.int64()),
+                pa.array([record.id for record in records], pa.int64()),
+                pa.array([record.text for record in records], pa.string()),
+                pa.array(
+                    [record.created_at for record in records], pa.timestamp("s")
+                ),
+            ],
+            schema=self._schema,
+        )
+        directory = self.directory / f"shard={shard:02d}"
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"part-{uuid.uuid4().hex}.parquet"
+        # Readers skip files starting with a dot, so never see a half written one
+        tmp_path = directory / f".{path.name}.tmp"
+        self._pq.write_table(
+            table,
+            tmp_path,
+            compression=PARQUET_COMPRESSION,
+            row_group_size=PARQUET_ROW_GROUP_SIZE,
+        )
+        _fsync(tmp_path)
+        tmp_path.rename(path)
+        _fsync(directory)
+
+
+def _fsync(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def tweet_sink(name: str, csv_path: str, day: date) -> TweetSink:
+    """The sink OUTPUT_FORMAT says to write tweets to"""
+    if OUTPUT_FORMAT == "parquet":
+        return ParquetSink(name, day)
+    if OUTPUT_FORMAT == "csv":
+        return CsvSink(csv_path)
+    raise ValueError(f"Unknown OUTPUT_FORMAT {OUTPUT_FORMAT}, use csv or parquet")
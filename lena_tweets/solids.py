@@ -1,30 +1,57 @@
+import math
 import time
-from datetime import datetime, timedelta
+from collections import Counter
+from concurrent.futures import Executor, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from functools import partial
 from pathlib import Path
-from typing import Iterable, List, Dict
+from typing import Dict, Iterable, List, Optional
 
 import pandas as pd
 import tweepy
-from dagster import solid
-from tweepy import User, Status
+from dagster import AssetMaterialization, EventMetadataEntry, Field, Output, solid
+from peewee import DateTimeField, ModelSelect
+from tweepy import User
 
+from lena_tweets import study_profiles
 from lena_tweets.config import (
+    COLLECTOR_IDLE_SLEEP,
+    COLLECTOR_REPORT_INTERVAL,
+    DAILY_TWEETS_CONCURRENCY,
+    TWEET_HISTORY_CONCURRENCY,
     TIMESTAMP_FORMAT,
-    DAILY_FRIENDS_CHECK_PATH,
+    TRACKER_INSERT_BATCH,
+    TRACKER_LEASE,
     DAILY_TWEETS_PATH,
     STUDY_END_PATH,
     STUDY_START_PATH,
     STUDY_INPUT_START_PART,
+    STORE_TWEETS_IN_DATABASE,
     TWEET_HISTORY,
 )
-from lena_tweets.database import connection_manager, Tracker
+from lena_tweets.compaction import compact
+from lena_tweets.database import connection_manager, database, tweets_due_at, Tracker
+from lena_tweets.friend_graph import (
+    has_spool,
+    read_spool,
+    record_friends,
+    remove_spool,
+    spool_friends,
+)
+from lena_tweets.known_users import KnownUsers
+from lena_tweets.polling import estimate_tweet_rate, next_poll_due
+from lena_tweets.rate_limit import credential_pool
+from lena_tweets.records import TweetRecord, tweet_records
+from lena_tweets.retry import is_fatal, retry_counts
 from lena_tweets.scrape_twitter import (
     get_friends,
-    get_user_tweets,
-    get_friends_ids,
+    get_new_tweets,
+    iter_friends_ids_pages,
     lookup_users,
-    get_all_most_recent_tweets,
+    iter_timeline_pages,
 )
+from lena_tweets.sinks import TweetSink, tweet_sink
+from lena_tweets.tweet_store import copy_tweets
 
 
 @solid
@@ -39,176 +66,654 @@ def get_ids_collect_info(context):
     with open(STUDY_INPUT_START_PART) as f:
         screen_names = [f.strip() for f in f.readlines() if f.strip()]
 
-    if Path(study_start_path).exists():
-        screen_names_already_seen = set(
-            pd.read_csv(study_start_path, lineterminator="\n")["screen_name"]
-        )
-        context.log.info(
-            f"{study_start_path} already exists, {len(screen_names_already_seen)} already exist."
-        )
-        header = False
-    else:
-        screen_names_already_seen = set()
-        context.log.info(f"{study_start_path} doesn't exist yet")
-        header = True
+    study_profiles.backfill(study_start_path)
+    screen_names_already_seen = study_profiles.seen_screen_names(screen_names)
+    context.log.info(f"{len(screen_names_already_seen)} already seen")
 
+    known_users = KnownUsers.load()
     for screen_name in screen_names:
         if screen_name in screen_names_already_seen:
             context.log.debug("{screen_name} already seen")
             continue
         try:
-            user, friends = get_friends(context.log, screen_name)
+            user, friends_ids, friends = get_friends(
+                context.log, screen_name, unseen=study_profiles.unseen
+            )
         except tweepy.RateLimitError as exc:
-            context.log.error(
-                "Rate limit reached. Sleeping for the next round 3 minutes"
+            for endpoint in ("users/show", "friends/ids", "users/lookup"):
+                credential_pool.wait_for_budget(endpoint, context.log)
+            user, friends_ids, friends = get_friends(
+                context.log, screen_name, unseen=study_profiles.unseen
             )
-            minute = datetime.now().minute
-            while datetime.now().minute == minute or datetime.now().minute % 3 != 0:
-                time.sleep(5)
-            user, friends = get_friends(context.log, screen_name)
         except tweepy.error.TweepError as exc:
             context.log.error(str(exc))
             continue
         context.log.info(f"Got id and friends of user {screen_name}")
-        users = [user] + friends
-        new_users = []
-        for i, u in enumerate(users):
-            if not u.screen_name in screen_names_already_seen:
-                new_users.append(u)
-                screen_names_already_seen.add(u.screen_name)
+        new_ids = set(study_profiles.unseen(u.id for u in [user] + friends))
+        new_users = [u for u in [user] + friends if u.id in new_ids]
 
-            # First element in list is the participant themselves
-            _add_to_tracker(u.id, participant=(i == 0))
+        record_friends(user.id, friends_ids)
+        _add_to_tracker(friends_ids, participant_ids=[user.id], known=known_users)
 
+        header = not Path(study_start_path).exists()
         df = _convert_friends_to_dataframe(new_users)
-        df.to_csv(study_start_path, index=False, mode="a", header=header)
+        with connection_manager(), database.atomic():
+            # Only marked as seen if they are written out
+            study_profiles.add(new_users)
+            df.to_csv(study_start_path, index=False, mode="a", header=header)
+        screen_names_already_seen.update(u.screen_name for u in new_users)
+
+
+@connection_manager()
+def _add_to_tracker(
+    user_ids: Iterable[int],
+    participant_ids: Iterable[int] = (),
+    known: Optional[KnownUsers] = None,
+):
+    """
+    Adds users that aren't tracked yet, in batches of TRACKER_INSERT_BATCH, and marks
+    participant_ids as participants whose friends were just retrieved, with no fetch
+    of them left unfinished, all in one transaction. Only users that aren't known are
+    sent, if known is given.
+    """
+    now = datetime.now()
+    if known is None:
+        user_ids = list(dict.fromkeys(user_ids))
+    else:
+        user_ids = known.new(user_ids).tolist()
+    with database.atomic():
+        for i in range(0, len(user_ids), TRACKER_INSERT_BATCH):
+            batch = user_ids[i : i + TRACKER_INSERT_BATCH]
+            Tracker.insert_many(
+                [{"user_id": user_id} for user_id in batch]
+            ).on_conflict_ignore().execute()
+        participants = [
+            {
+                "user_id": user_id,
+                "participant": True,
+                "friends_last_retrieved": now,
+                "friends_cursor": None,
+            }
+            for user_id in dict.fromkeys(participant_ids)
+        ]
+        if participants:
+            Tracker.insert_many(participants).on_conflict(
+                conflict_target=[Tracker.user_id],
+                update={
+                    Tracker.participant: True,
+                    Tracker.friends_last_retrieved: now,
+                    Tracker.friends_lease_expires: None,
+                    Tracker.friends_cursor: None,
+                },
+            ).execute()
+    if known is not None:
+        known.add(user_ids)
 
 
 @connection_manager()
-def _add_to_tracker(user_id: int, participant: bool = False):
-    user, _ = Tracker.get_or_create(user_id=user_id)
-    if participant:
-        user.participant = True
-        user.friends_last_retrieved = datetime.now()
-        user.save()
+def _claim(query: ModelSelect, limit: int, lease: DateTimeField) -> List[Tracker]:
+    """
+    Leases the first limit users query selects for TRACKER_LEASE seconds, setting the
+    lease field. Users leased to other runs, or being claimed by them at the same
+    time, are skipped, so runs in parallel get different users.
+    """
+    now = datetime.now()
+    with database.atomic():
+        items = list(
+            query.where(lease.is_null() | (lease < now))
+            .limit(limit)
+            .for_update("FOR UPDATE SKIP LOCKED")
+        )
+        if items:
+            Tracker.update({lease: now + timedelta(seconds=TRACKER_LEASE)}).where(
+                Tracker.id.in_([item.id for item in items])
+            ).execute()
+    return items
 
 
 @connection_manager()
-def _get_next_user() -> int:
-    never_checked = Tracker.select().where(
-        (Tracker.friends_last_retrieved.is_null()) & (Tracker.participant == True)
+def _release(user_ids: Iterable[int], lease: DateTimeField):
+    """Gives up the leases of users a run didn't get to"""
+    user_ids = list(user_ids)
+    if user_ids:
+        Tracker.update({lease: None}).where(Tracker.user_id.in_(user_ids)).execute()
+
+
+def _get_next_users(
+    limit: int = 1, checked_before: Optional[datetime] = None
+) -> List[int]:
+    """
+    Participants whose friends were checked longest ago, never checked first, and only
+    those last checked before checked_before if given
+    """
+    query = Tracker.select(Tracker.id, Tracker.user_id).where(
+        Tracker.participant == True
     )
-    if never_checked.count():
-        return never_checked.first().user_id
-    return (
-        Tracker.select()
-        .where(Tracker.participant == True)
-        .order_by(Tracker.friends_last_retrieved)
-        .first()
-        .user_id
+    if checked_before is not None:
+        query = query.where(
+            Tracker.friends_last_retrieved.is_null()
+            | (Tracker.friends_last_retrieved < checked_before)
+        )
+    items = _claim(
+        query.order_by(Tracker.friends_last_retrieved.asc(nulls="first")),
+        limit,
+        Tracker.friends_lease_expires,
     )
+    return [item.user_id for item in items]
 
 
 @solid(config_schema={"timestamp": str})
 def get_friends_of_users(context):
-    for _ in range(10):
-        try:
-            get_friends_of_user(context)
-        except tweepy.RateLimitError as exc:
-            context.log.error("tweepy.RateLimitError, will continue from here.")
-            break
+    known_users = KnownUsers.load()
+    try:
+        get_friends_of_user_batch(context, known_users, 10)
+    except tweepy.RateLimitError as exc:
+        context.log.error("tweepy.RateLimitError, will continue from here.")
+    context.log.info(f"Retries per endpoint: {retry_counts()}")
+
+
+def get_friends_of_user_batch(
+    context,
+    known_users: KnownUsers,
+    batch_size: int,
+    checked_before: Optional[datetime] = None,
+) -> int:
+    """
+    Collects friends of the next batch_size participants, and returns the number of
+    participants picked
+    """
+    user_ids = _get_next_users(batch_size, checked_before)
+    n_done = 0
+    try:
+        for user_id in user_ids:
+            get_friends_of_user(context, user_id, known_users)
+            n_done += 1
+    finally:
+        _release(user_ids[n_done:], Tracker.friends_lease_expires)
+    return len(user_ids)
 
 
-def get_friends_of_user(context):
+def get_friends_of_user(context, next_user_id: int, known_users: KnownUsers):
     """
-    Collects friends of a user and appends it to a csv file.
+    Collects friends of a user and records who they followed and unfollowed since.
+
+    The follow list is fetched a page at a time. Each page is spooled to disk and its
+    users added to the tracker, then the cursor of the next page is saved, so a fetch
+    cut short by the rate limit carries on from there the next time the user is picked.
     """
-    next_user_id = _get_next_user()
+    cursor = _get_friends_cursor(next_user_id)
+    if cursor is None or not has_spool(next_user_id):
+        cursor = -1
+        remove_spool(next_user_id)
+    elif cursor != -1:
+        context.log.info(f"Carrying on with friends of {next_user_id} from {cursor}")
 
-    timestamp = context.solid_config.get(
-        "timestamp", datetime.now().strftime(TIMESTAMP_FORMAT)
-    )
     try:
-        friends_ids = get_friends_ids(context.log, next_user_id)
+        for friends_ids, cursor in iter_friends_ids_pages(
+            context.log, next_user_id, cursor
+        ):
+            spool_friends(next_user_id, friends_ids)
+            _add_to_tracker(friends_ids, known=known_users)
+            _save_friends_cursor(next_user_id, cursor)
+    except tweepy.RateLimitError:
+        raise
     except tweepy.error.TweepError as exc:
         context.log.error(f"Unsuccessful fetch for user_id {next_user_id}: {exc}")
-        friends_ids = []
+        # Nothing is recorded, an empty list would look like everyone was unfollowed
+        _add_to_tracker([], participant_ids=[next_user_id])
+        remove_spool(next_user_id)
+        return
+
+    friends_ids = read_spool(next_user_id)
+    followed, unfollowed = record_friends(next_user_id, friends_ids)
+    context.log.info(
+        f"User {next_user_id} follows {len(friends_ids)}: {len(followed)} followed, "
+        f"{len(unfollowed)} unfollowed since last time"
+    )
+    _add_to_tracker([], participant_ids=[next_user_id])
+    remove_spool(next_user_id)
 
-    header = not Path(DAILY_FRIENDS_CHECK_PATH.format(timestamp)).exists()
 
-    pd.DataFrame({"user_id": next_user_id, "friends_id": friends_ids}).to_csv(
-        DAILY_FRIENDS_CHECK_PATH.format(timestamp), mode="a", header=header, index=False
+@connection_manager()
+def _get_friends_cursor(user_id: int) -> Optional[int]:
+    return (
+        Tracker.select(Tracker.friends_cursor)
+        .where(Tracker.user_id == user_id)
+        .scalar()
     )
-    for u in friends_ids:
-        _add_to_tracker(u)
 
-    _add_to_tracker(next_user_id, participant=True)
 
-
-@solid(config_schema={"timestamp": str})
+@connection_manager()
+def _save_friends_cursor(user_id: int, cursor: int):
+    """Saves where the fetch of the user's follow list got to, renewing the lease"""
+    Tracker.update(
+        friends_cursor=cursor,
+        friends_lease_expires=datetime.now() + timedelta(seconds=TRACKER_LEASE),
+    ).where(Tracker.user_id == user_id).execute()
+
+
+@solid(
+    config_schema={
+        "timestamp": str,
+        "concurrency": Field(int, is_required=False, default_value=1),
+    }
+)
 def collect_tweets_of_users(context, all_tweets: bool = False):
     """
     Collects tweets the user tweets
+
+    Users are claimed from the tracker in batches of `concurrency` and their timelines
+    are fetched in parallel. New tweets are written in the order users were claimed,
+    full histories are streamed out a page at a time.
     """
+    concurrency = context.solid_config["concurrency"]
+    timestamp = context.solid_config["timestamp"]
+    day = datetime.strptime(timestamp, TIMESTAMP_FORMAT).date()
+    if all_tweets:
+        sink = tweet_sink("tweet_history", TWEET_HISTORY, day)
+    else:
+        sink = tweet_sink("daily_tweets", DAILY_TWEETS_PATH.format(timestamp), day)
     initial_timestamp = datetime.now()
-    while datetime.now() - initial_timestamp < timedelta(minutes=3):
-        try:
-            collect_tweets_of_user(context, all_tweets=all_tweets)
-        except tweepy.RateLimitError as exc:
-            context.log.error("tweepy.RateLimitError, will continue from here.")
-            break
-
-    context.log.info("Have been running for over 3 minutes, returning")
+    with ThreadPoolExecutor(max_workers=concurrency) as executor, sink:
+        while datetime.now() - initial_timestamp < timedelta(minutes=3):
+            try:
+                if all_tweets:
+                    collected = collect_tweet_history_batch(
+                        context, executor, concurrency, sink
+                    )
+                else:
+                    collected = collect_tweets_of_user_batch(
+                        context, executor, concurrency, sink
+                    )
+            except tweepy.RateLimitError as exc:
+                context.log.error("tweepy.RateLimitError, will continue from here.")
+                break
+            if not collected:
+                context.log.info("No users left to collect tweets of, returning")
+                break
+        else:
+            context.log.info("Have been running for over 3 minutes, returning")
+
+    context.log.info(f"Retries per endpoint: {retry_counts()}")
     return
 
 
+@solid(
+    config_schema={
+        "concurrency": Field(
+            int, is_required=False, default_value=DAILY_TWEETS_CONCURRENCY
+        ),
+        "history_concurrency": Field(
+            int, is_required=False, default_value=TWEET_HISTORY_CONCURRENCY
+        ),
+        "hours": Field(
+            float,
+            is_required=False,
+            default_value=0.0,
+            description="Hours to run for, runs until stopped if 0",
+        ),
+    }
+)
+def run_collector(context):
+    """
+    Checks the friends of participants once a day, polls users for new tweets when
+    they are due and collects tweet histories, for as long as it runs. The api
+    clients, database connections and output files stay open throughout.
+
+    Each round does a batch of every kind of work that is due and that there is rate
+    limit budget for, new tweets coming before histories. When there is none, it sleeps
+    until the budget it is waiting on comes back or the next user is due. Progress is
+    reported as a materialization every COLLECTOR_REPORT_INTERVAL seconds.
+    """
+    concurrency = context.solid_config["concurrency"]
+    history_concurrency = context.solid_config["history_concurrency"]
+    hours = context.solid_config["hours"]
+    stop_at = time.monotonic() + hours * 60 * 60 if hours else math.inf
+    next_report = time.monotonic() + COLLECTOR_REPORT_INTERVAL
+    known_users = KnownUsers.load()
+    progress = Counter()
+    sinks = _CollectorSinks(progress)
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, history_concurrency))
+    try:
+        while time.monotonic() < stop_at:
+            sinks.roll_over()
+            seconds = _collect_round(
+                context,
+                executor,
+                sinks,
+                known_users,
+                progress,
+                concurrency,
+                history_concurrency,
+            )
+            if time.monotonic() >= next_report:
+                yield _collector_progress(progress, sinks)
+                next_report = time.monotonic() + COLLECTOR_REPORT_INTERVAL
+            seconds = max(min(seconds, stop_at - time.monotonic()), 0)
+            # Users are leased until what was collected for them is written out, so
+            # nothing is left buffered past when it's due while sleeping
+            sinks.flush_if_due(within=seconds)
+            if seconds:
+                time.sleep(seconds)
+    finally:
+        executor.shutdown()
+        sinks.close()
+    context.log.info(f"Retries per endpoint: {retry_counts()}")
+    yield _collector_progress(progress, sinks)
+    yield Output(None)
+
+
+class _CollectorSinks:
+    """The collector's sinks for new tweets and histories, new ones every day"""
+
+    def __init__(self, progress: Counter):
+        self.progress = progress
+        self.day = None
+        self.daily = self.history = None
+
+    def roll_over(self):
+        today = date.today()
+        if today == self.day:
+            return
+        self.close()
+        self.day = today
+        timestamp = today.strftime(TIMESTAMP_FORMAT)
+        daily_path = DAILY_TWEETS_PATH.format(timestamp)
+        self.daily = tweet_sink("daily_tweets", daily_path, today)
+        self.history = tweet_sink("tweet_history", TWEET_HISTORY, today)
+
+    def n_written(self) -> int:
+        return sum(sink.n_written for sink in (self.daily, self.history) if sink)
+
+    def flush_if_due(self, within: float = 0):
+        for sink in (self.daily, self.history):
+            if sink is not None:
+                sink.flush_if_due(within)
+
+    def close(self):
+        for sink in (self.daily, self.history):
+            if sink is not None:
+                sink.close()
+        self.progress["tweets"] += self.n_written()
+        self.daily = self.history = None
+
+
+def _collect_round(
+    context,
+    executor: Executor,
+    sinks: _CollectorSinks,
+    known_users: KnownUsers,
+    progress: Counter,
+    concurrency: int,
+    history_concurrency: int,
+) -> float:
+    """
+    Does a batch of each kind of work that is due and has rate limit budget. Returns 0
+    if there was any, otherwise the seconds until there may be.
+    """
+    worked = False
+    today = datetime.combine(date.today(), datetime.min.time())
+    friends_wait = credential_pool.seconds_until_available("friends/ids")
+    if not friends_wait:
+        try:
+            n_users = get_friends_of_user_batch(
+                context, known_users, 10, checked_before=today
+            )
+        except tweepy.RateLimitError:
+            context.log.info("Rate limited checking friends, carrying on after reset")
+            n_users = 1
+        progress["friends_checked"] += n_users
+        worked |= bool(n_users)
+
+    timeline_wait = credential_pool.seconds_until_available("statuses/user_timeline")
+    if not timeline_wait:
+        try:
+            n_users = collect_tweets_of_user_batch(
+                context, executor, concurrency, sinks.daily
+            )
+            progress["users_polled"] += n_users
+            if not n_users:
+                n_users = collect_tweet_history_batch(
+                    context, executor, history_concurrency, sinks.history
+                )
+                progress["histories"] += n_users
+        except tweepy.RateLimitError:
+            context.log.info("Rate limited collecting tweets, carrying on after reset")
+            n_users = 1
+        worked |= bool(n_users)
+
+    if worked:
+        return 0
+    waits = [COLLECTOR_IDLE_SLEEP, friends_wait or math.inf]
+    waits.append(timeline_wait or _seconds_until_tweets_due())
+    # Users due but leased to other runs would otherwise keep it from sleeping
+    return max(min(waits), 1)
+
+
 @connection_manager()
-def _get_next_user_for_tweets():
-    never_checked = Tracker.select().where(Tracker.tweets_last_retrieved.is_null())
-    if never_checked.count():
-        return never_checked.first()
-    return Tracker.select().order_by(Tracker.tweets_last_retrieved).first()
+def _seconds_until_tweets_due() -> float:
+    now = datetime.now()
+    next_due = (
+        Tracker.select(tweets_due_at)
+        .where(tweets_due_at > now)
+        .order_by(tweets_due_at)
+        .limit(1)
+        .scalar()
+    )
+    if next_due is None:
+        return math.inf
+    return (next_due - now).total_seconds()
+
+
+def _collector_progress(progress: Counter, sinks: _CollectorSinks):
+    tweets = progress["tweets"] + sinks.n_written()
+    return AssetMaterialization(
+        asset_key="collector_progress",
+        description=f"Collected {tweets} tweets",
+        metadata_entries=[
+            EventMetadataEntry.int(tweets, "tweets"),
+            EventMetadataEntry.int(progress["users_polled"], "users_polled"),
+            EventMetadataEntry.int(progress["histories"], "histories"),
+            EventMetadataEntry.int(progress["friends_checked"], "friends_checked"),
+            EventMetadataEntry.json(retry_counts(), "retries"),
+        ],
+    )
+
+
+def _get_next_users_for_tweets(limit: int = 1) -> List[Tracker]:
+    """
+    Users due a poll for new tweets, the longest overdue first. Users that were never
+    polled have no due time and come before everyone else.
+    """
+    return _claim(
+        Tracker.select()
+        .where(tweets_due_at <= datetime.now())
+        .order_by(tweets_due_at),
+        limit,
+        Tracker.tweets_lease_expires,
+    )
+
+
+def _get_next_users_for_history(limit: int = 1) -> List[Tracker]:
+    """Users whose history hasn't been collected yet, unfinished walks first"""
+    return _claim(
+        Tracker.select()
+        .where(Tracker.history_retrieved.is_null())
+        .order_by(Tracker.history_max_id.desc(nulls="last"), Tracker.id),
+        limit,
+        Tracker.tweets_lease_expires,
+    )
 
 
 @connection_manager()
-def _update_item(item, latest_tweet_id):
-    item.tweets_last_retrieved = datetime.now()
-    item.latest_tweet_id = latest_tweet_id
-    item.save()
+def _update_item(item: Tracker, records: List[TweetRecord]):
+    """Moves the user on past records, storing them with it if they go in the db"""
+    now = datetime.now()
+    item.tweet_rate = estimate_tweet_rate(
+        item.tweet_rate, item.tweets_last_retrieved, records
+    )
+    item.tweets_next_due = next_poll_due(item.tweet_rate, now)
+    item.tweets_last_retrieved = now
+    if records:
+        item.latest_tweet_id = records[0].id
+    item.tweets_lease_expires = None
+    with database.atomic():
+        if STORE_TWEETS_IN_DATABASE:
+            copy_tweets(database, records)
+        item.save(
+            only=[
+                Tracker.tweet_rate,
+                Tracker.tweets_next_due,
+                Tracker.tweets_last_retrieved,
+                Tracker.latest_tweet_id,
+                Tracker.tweets_lease_expires,
+            ]
+        )
 
 
-def collect_tweets_of_user(context, all_tweets: bool = False):
+@connection_manager()
+def _save_history_position(item: Tracker, records: List[TweetRecord]):
     """
-    Collects tweets the user tweets
+    Saves how far back the walk got, past records, and renews the lease on the user.
+    Records are stored with it if they go in the db.
     """
-    timestamp = context.solid_config.get(
-        "timestamp", datetime.now().strftime(TIMESTAMP_FORMAT)
+    item.history_max_id = records[-1].id - 1
+    item.tweets_lease_expires = datetime.now() + timedelta(seconds=TRACKER_LEASE)
+    with database.atomic():
+        if STORE_TWEETS_IN_DATABASE:
+            copy_tweets(database, records)
+        item.save(
+            only=[
+                Tracker.history_max_id,
+                Tracker.latest_tweet_id,
+                Tracker.tweets_lease_expires,
+            ]
+        )
+
+
+@connection_manager()
+def _finish_history(item: Tracker):
+    item.history_max_id = None
+    item.history_retrieved = item.tweets_last_retrieved = datetime.now()
+    item.tweets_lease_expires = None
+    item.save(
+        only=[
+            Tracker.history_max_id,
+            Tracker.history_retrieved,
+            Tracker.tweets_last_retrieved,
+            Tracker.tweets_lease_expires,
+        ]
     )
 
-    next_item = _get_next_user_for_tweets()
-    user_id = next_item.user_id
-    latest_tweet_id = next_item.latest_tweet_id
 
-    if all_tweets:
-        statuses = _convert_tweets_to_dataframe(
-            user_id, get_all_most_recent_tweets(context.log, user_id)
+def collect_tweets_of_user_batch(
+    context, executor: Executor, batch_size: int, sink: TweetSink
+) -> int:
+    """
+    Collects new tweets of the next batch_size users, fetching them concurrently on
+    executor, and returns the number of users collected
+    """
+    items = _get_next_users_for_tweets(batch_size)
+    futures = [executor.submit(_fetch_tweets, context, item) for item in items]
+    n_stored = 0
+    try:
+        for item, future in zip(items, futures):
+            _store_tweets(context, sink, item, future.result())
+            n_stored += 1
+    finally:
+        for future in futures:
+            future.cancel()
+        _release(
+            (item.user_id for item in items[n_stored:]), Tracker.tweets_lease_expires
         )
-        tweet_file_path = Path(TWEET_HISTORY)
+    return len(items)
 
-    else:
-        statuses = _convert_tweets_to_dataframe(
-            user_id, get_user_tweets(context.log, user_id, since_id=latest_tweet_id)
+
+def collect_tweet_history_batch(
+    context, executor: Executor, batch_size: int, sink: TweetSink
+) -> int:
+    """
+    Collects the history of the next batch_size users concurrently on executor, and
+    returns the number of users collected
+    """
+    items = _get_next_users_for_history(batch_size)
+    futures = [
+        executor.submit(collect_tweet_history_of_user, context, sink, item)
+        for item in items
+    ]
+    wait(futures)
+    # Finished walks keep their lease until the sink writes them out
+    _release(
+        (item.user_id for item, future in zip(items, futures) if future.exception()),
+        Tracker.tweets_lease_expires,
+    )
+    for future in futures:
+        future.result()
+    return len(items)
+
+
+def collect_tweet_history_of_user(context, sink: TweetSink, item: Tracker):
+    """
+    Streams the tweets of a user into sink a page at a time, saving how far back it
+    got after every page is written so that an interrupted walk carries on from there.
+    """
+    user_id = item.user_id
+    n_tweets = 0
+    new_walk = item.history_max_id is None
+    pages = iter_timeline_pages(
+        context.log, user_id, max_id=item.history_max_id, raw=True
+    )
+    try:
+        for page in pages:
+            records = tweet_records(user_id, page)
+            if new_walk and not n_tweets:
+                # The first page of a walk has the newest tweet, daily scrapes go on
+                # from it
+                item.latest_tweet_id = max(records[0].id, item.latest_tweet_id or 0)
+            sink.write(records, partial(_save_history_position, item, records))
+            n_tweets += len(records)
+    except tweepy.RateLimitError:
+        raise
+    except tweepy.error.TweepError as exc:
+        if not is_fatal(exc):
+            # Carried on with by whichever run picks the user once the lease runs out
+            context.log.error(f"Failed collecting history of user {user_id}: {exc}")
+            return
+        context.log.warning(f"Can't collect history of user {user_id}: {exc}")
+
+    sink.write([], partial(_finish_history, item))
+    context.log.info(f"Collected history of user {user_id}, {n_tweets} tweets")
+
+
+def _fetch_tweets(context, item: Tracker) -> List[TweetRecord]:
+    """
+    New tweets of the user. None if they can't be fetched, so the user is moved on to
+    their next poll rather than stopping the run, and since_id stays where it was.
+    """
+    try:
+        tweets = get_new_tweets(
+            context.log, item.user_id, since_id=item.latest_tweet_id, raw=True
         )
-        tweet_file_path = Path(DAILY_TWEETS_PATH.format(timestamp))
+    except tweepy.RateLimitError:
+        raise
+    except tweepy.error.TweepError as exc:
+        context.log.warning(f"Can't get new tweets of user {item.user_id}: {exc}")
+        return []
+    return tweet_records(item.user_id, tweets)
 
-    header = not tweet_file_path.exists()
-    statuses.to_csv(tweet_file_path, mode="a", header=header, index=False)
 
-    context.log.info(f"Collected {len(statuses)} tweets for user {user_id}")
+def _store_tweets(context, sink: TweetSink, item: Tracker, records: List[TweetRecord]):
+    """Writes records to sink, moving the user on past them once they are written"""
+    sink.write(records, partial(_update_item, item, records))
+    context.log.info(f"Collected {len(records)} tweets for user {item.user_id}")
 
-    _update_item(next_item, statuses.iloc[0]["id"] if len(statuses) else None)
 
-    context.log.info(f"Updated user_id {user_id}, {len(statuses)} new tweets")
+@solid
+def compact_tweets(context):
+    """
+    Merges the tweets collected since the last compaction into the compacted archive
+    """
+    compact(context.log)
 
 
 def _convert_friends_to_dataframe(users: List[User]):
@@ -224,16 +729,3 @@ def _convert_friends_to_dataframe(users: List[User]):
         ]
     )
 
-
-def _convert_tweets_to_dataframe(user_id: int, tweets: List[Status]):
-    return pd.DataFrame(
-        [
-            {
-                "user_id": int(float(user_id)),
-                "id": int(float(tweet.id)),
-                "text": tweet.text,
-                "created_at": tweet.created_at,
-            }
-            for tweet in tweets
-        ]
-    )
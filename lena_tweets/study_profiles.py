@@ -0,0 +1,73 @@
+"""
+Which users kick_off_study has written the profiles of, looked up in the StudyProfile
+table rather than by reading the study start csv back in, so restarts don't slow down
+as the csv grows.
+"""
+from pathlib import Path
+from typing import Iterable, List, Set
+
+import numpy as np
+import pandas as pd
+from peewee import Value, fn
+from tweepy import User
+
+from lena_tweets.config import TRACKER_INSERT_BATCH
+from lena_tweets.database import StudyProfile, connection_manager, database
+
+
+@connection_manager()
+def backfill(study_start_path: str):
+    """
+    Fills StudyProfile from the study start csv, if the csv is there and the table is
+    still empty, e.g. for studies started before the table was.
+    """
+    if not Path(study_start_path).exists() or StudyProfile.select().exists():
+        return
+    profiles = pd.read_csv(
+        study_start_path,
+        lineterminator="\n",
+        usecols=["user_id", "screen_name"],
+        dtype={"user_id": np.int64, "screen_name": str},
+    )
+    _insert(zip(profiles["user_id"].tolist(), profiles["screen_name"].tolist()))
+
+
+@connection_manager()
+def seen_screen_names(screen_names: Iterable[str]) -> Set[str]:
+    """Those of screen_names that profiles were written for"""
+    query = StudyProfile.select(StudyProfile.screen_name).where(
+        StudyProfile.screen_name == _any(screen_names)
+    )
+    return {screen_name for screen_name, in query.tuples()}
+
+
+@connection_manager()
+def unseen(user_ids: Iterable[int]) -> List[int]:
+    """Those of user_ids that no profile was written for, in order"""
+    user_ids = [int(user_id) for user_id in user_ids]
+    query = StudyProfile.select(StudyProfile.user_id).where(
+        StudyProfile.user_id == _any(user_ids)
+    )
+    seen = {user_id for user_id, in query.tuples()}
+    return [user_id for user_id in user_ids if user_id not in seen]
+
+
+@connection_manager()
+def add(users: List[User]):
+    """Call in the transaction the profiles of users are written out in"""
+    _insert((user.id, user.screen_name) for user in users)
+
+
+def _any(values: Iterable):
+    """Matches any of values, sent as one array parameter however many there are"""
+    return fn.ANY(Value(list(values), unpack=False, converter=False))
+
+
+def _insert(profiles: Iterable[tuple]):
+    profiles = list(profiles)
+    with database.atomic():
+        for i in range(0, len(profiles), TRACKER_INSERT_BATCH):
+            StudyProfile.insert_many(
+                profiles[i : i + TRACKER_INSERT_BATCH],
+                fields=[StudyProfile.user_id, StudyProfile.screen_name],
+            ).on_conflict_ignore().execute()
@@ -0,0 +1,233 @@
+"""
+Reads the collected tweets of a user, optionally within a time range, without scanning
+all the csv files they were collected into.
+
+A sidecar sqlite index at TWEET_INDEX_PATH keeps, for each file, blocks of consecutive
+rows of the same user: their byte range and their earliest and latest created_at.
+Queries look up the blocks of the user that overlap the time range and only read those,
+from the memory mapped files. The index is brought up to date by reading what was
+appended to the files since it was last updated.
+
+    python -m lena_tweets.tweet_reader 12345 --since 2021-01-01 --until 2021-01-08
+"""
+import argparse
+import csv
+import io
+import mmap
+import os
+import sqlite3
+import sys
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from lena_tweets.compaction import HEADER, complete_rows_end, is_header, source_paths
+from lena_tweets.config import TWEET_INDEX_PATH
+from lena_tweets.records import TweetRecord
+
+# Bytes of a file indexed at a time
+INDEX_CHUNK_SIZE = 64 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    indexed_to INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    path TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    min_created_at TEXT NOT NULL,
+    max_created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_user_id_created_at
+    ON blocks (user_id, max_created_at, min_created_at);
+"""
+
+
+class TweetReader:
+    """
+    Reads tweets out of the collected csv files through the index. Can be used as a
+    context manager that closes it.
+    """
+
+    def __init__(self, index_path: str = TWEET_INDEX_PATH):
+        self._index = sqlite3.connect(index_path)
+        self._index.executescript(SCHEMA)
+        self._maps: Dict[str, Tuple[int, mmap.mmap]] = {}
+
+    def update(self, paths: Optional[List[str]] = None) -> int:
+        """
+        Indexes what was appended to paths, the collected csv files by default, since
+        the last update. Returns how many blocks were added.
+        """
+        added = 0
+        for path in source_paths() if paths is None else paths:
+            if os.path.exists(path):
+                added += self._update_file(path)
+        return added
+
+    def tweets(
+        self,
+        user_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ) -> List[TweetRecord]:
+        """
+        The tweets of user_id created from since up to until, oldest first and each
+        once, however many files it was collected into.
+        """
+        since_text = "" if since is None else since.isoformat(sep=" ")
+        until_text = "~" if until is None else until.isoformat(sep=" ")
+        blocks = self._index.execute(
+            "SELECT path, start, end FROM blocks WHERE user_id = ? "
+            "AND max_created_at >= ? AND min_created_at < ? ORDER BY path, start",
+            (user_id, since_text, until_text),
+        )
+        records = {}
+        for path, start, end in blocks:
+            text = self._map(path, end)[start:end].decode()
+            for row in csv.reader(io.StringIO(text, newline="")):
+                if since_text <= row[3] < until_text:
+                    records[int(row[1])] = TweetRecord(
+                        int(row[0]), int(row[1]), row[2], datetime.fromisoformat(row[3])
+                    )
+        return [records[tweet_id] for tweet_id in sorted(records)]
+
+    def close(self):
+        for _, mapped in self._maps.values():
+            mapped.close()
+        self._maps = {}
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _map(self, path: str, end: int) -> mmap.mmap:
+        """path memory mapped, mapped again if it grew past end since"""
+        size, mapped = self._maps.get(path, (0, None))
+        if size < end:
+            if mapped is not None:
+                mapped.close()
+            with open(path, "rb") as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[path] = (len(mapped), mapped)
+        return mapped
+
+    def _update_file(self, path: str) -> int:
+        row = self._index.execute(
+            "SELECT indexed_to FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        indexed_to = 0 if row is None else row[0]
+        size = os.path.getsize(path)
+        if size < indexed_to:
+            # Replaced by a different file, indexed again from the start
+            indexed_to = 0
+            with self._index:
+                self._index.execute("DELETE FROM blocks WHERE path = ?", (path,))
+        if size == indexed_to:
+            return 0
+
+        added = 0
+        mapped = self._map(path, size)
+        while indexed_to < size:
+            chunk = mapped[indexed_to : indexed_to + INDEX_CHUNK_SIZE]
+            end = complete_rows_end(chunk)
+            if not end:
+                if indexed_to + len(chunk) < size:
+                    raise ValueError(f"Row at {indexed_to} of {path} is too long")
+                # The rest is a row still being written
+                break
+            blocks = list(_blocks(chunk[:end], indexed_to, not indexed_to, path))
+            indexed_to += end
+            with self._index:
+                self._index.executemany(
+                    "INSERT INTO blocks VALUES (?, ?, ?, ?, ?, ?)",
+                    [(path, *block) for block in blocks],
+                )
+                self._index.execute(
+                    "INSERT OR REPLACE INTO files VALUES (?, ?)", (path, indexed_to)
+                )
+            added += len(blocks)
+        return added
+
+
+def _blocks(data: bytes, offset: int, skip_header: bool, path: str) -> Iterator[tuple]:
+    """
+    Blocks of consecutive rows of the same user in data, complete csv rows starting
+    at byte offset of the file at path, as user_id, start, end, min and max
+    created_at. Blank rows end a block and are left out of all of them.
+    """
+    block = None
+    for start, end in _row_ranges(data):
+        if not data[start:end].strip():
+            if block is not None:
+                yield tuple(block)
+                block = None
+            continue
+        if skip_header:
+            skip_header = False
+            text = data[start:end].decode()
+            first = next(csv.reader(io.StringIO(text, newline="")))
+            if is_header(first, path):
+                continue
+        # user_id comes first and created_at last, neither of them quoted
+        user_id = int(data[start : data.index(b",", start)])
+        created_at = data[data.rindex(b",", start, end) + 1 : end - 1].decode()
+        if block is not None and block[0] == user_id:
+            block[2] = offset + end
+            block[3] = min(block[3], created_at)
+            block[4] = max(block[4], created_at)
+        else:
+            if block is not None:
+                yield tuple(block)
+            block = [user_id, offset + start, offset + end, created_at, created_at]
+    if block is not None:
+        yield tuple(block)
+
+
+def _row_ranges(data: bytes) -> Iterator[Tuple[int, int]]:
+    """
+    Where each row of complete csv rows starts and ends. A newline only ends a row
+    when an even number of quotes come before it, otherwise it's inside a field.
+    """
+    start = end = 0
+    in_quotes = False
+    for line in data.split(b"\n")[:-1]:
+        end += len(line) + 1
+        if line.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not in_quotes:
+            yield start, end
+            start = end
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Writes the collected tweets of a user to stdout as csv"
+    )
+    parser.add_argument("user_id", type=int)
+    parser.add_argument("--since", type=datetime.fromisoformat)
+    parser.add_argument("--until", type=datetime.fromisoformat)
+    parser.add_argument("--index", default=TWEET_INDEX_PATH)
+    parser.add_argument(
+        "--no-update",
+        action="store_true",
+        help="Don't index what was collected since the index was last updated",
+    )
+    args = parser.parse_args()
+
+    with TweetReader(args.index) as reader:
+        if not args.no_update:
+            reader.update()
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        writer.writerow(HEADER)
+        records = reader.tweets(args.user_id, args.since, args.until)
+        writer.writerows(record.as_row() for record in records)
+
+
+if __name__ == "__main__":
+    main()
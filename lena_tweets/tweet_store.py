@@ -0,0 +1,72 @@
+"""
+Bulk loading of tweets into the tweet table.
+
+Tweets are copied into a staging table with COPY and moved into the tweet table from
+there, skipping ones already stored, so loading the same tweets again is harmless.
+"""
+import csv
+import io
+import threading
+from datetime import datetime
+from typing import List, Set, Tuple
+
+from lena_tweets.records import TweetRecord
+
+COLUMNS = ", ".join(TweetRecord.__slots__)
+
+# Partitions known to exist, as (year, month)
+_partitions: Set[Tuple[int, int]] = set()
+_partitions_lock = threading.Lock()
+
+
+def copy_tweets(db, records: List[TweetRecord]):
+    """
+    Stores records in the tweet table. Needs to be called in a transaction, which
+    the records are only stored with once it commits.
+    """
+    if not records:
+        return
+    _create_partitions(db, {(r.created_at.year, r.created_at.month) for r in records})
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for record in records:
+        # Postgres text can't hold NUL characters
+        writer.writerow(
+            (record.user_id, record.id, record.text.replace("\0", ""), record.created_at)
+        )
+    buffer.seek(0)
+
+    cursor = db.connection().cursor()
+    # Kept for the life of the connection
+    cursor.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS tweet_staging (LIKE tweet INCLUDING DEFAULTS)"
+    )
+    cursor.copy_expert(
+        f"COPY tweet_staging ({COLUMNS}) FROM STDIN WITH (FORMAT csv)", buffer
+    )
+    cursor.execute(
+        f"INSERT INTO tweet ({COLUMNS}) SELECT {COLUMNS} FROM tweet_staging "
+        "ON CONFLICT DO NOTHING"
+    )
+    cursor.execute("TRUNCATE tweet_staging")
+
+
+def _create_partitions(db, months: Set[Tuple[int, int]]):
+    with _partitions_lock:
+        missing = months - _partitions
+    for year, month in sorted(missing):
+        name = f"tweet_y{year}m{month:02d}"
+        if db.execute_sql("SELECT to_regclass(%s)", (name,)).fetchone()[0]:
+            with _partitions_lock:
+                _partitions.add((year, month))
+            continue
+        # Not remembered as created until seen again, in case the transaction fails
+        start = datetime(year, month, 1)
+        end = datetime(year + month // 12, month % 12 + 1, 1)
+        # Stops runs in parallel from creating the same partition at the same time
+        db.execute_sql("SELECT pg_advisory_xact_lock(hashtext('tweet_partitions'))")
+        db.execute_sql(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF tweet "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
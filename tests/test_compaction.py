@@ -0,0 +1,104 @@
+import logging
+
+import pytest
+
+from lena_tweets import compaction
+from lena_tweets.compaction import compact, complete_rows_end, read_archive
+
+HEADER = b"user_id,id,text,created_at\n"
+log = logging.getLogger(__name__)
+
+
+@pytest.mark.parametrize(
+    "data, end",
+    [
+        (b"", 0),
+        (b"1,2,text,2021", 0),
+        (b"1,2,text,2021\n", 14),
+        (b"1,2,text,2021\n3,4,te", 14),
+        (b'1,2,"a\nb",2021\n', 15),
+        (b'1,2,"a\nb",2021\n3,4,"c\n', 15),
+        (b'1,2,"a\nb",2021\n3,4,"c\nd', 15),
+        (b'1,2,"say ""hi""\n",2021\n', 23),
+        (b'1,2,"""\n",2021\n3,4,"\n', 15),
+    ],
+)
+def test_complete_rows_end(data, end):
+    assert complete_rows_end(data) == end
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(compaction, "TWEET_HISTORY", str(tmp_path / "history.csv"))
+    monkeypatch.setattr(
+        compaction, "DAILY_TWEETS_PATH", str(tmp_path / "{}_tweets.csv")
+    )
+    monkeypatch.setattr(compaction, "COMPACTION_DIR", str(tmp_path / "compacted"))
+    return tmp_path
+
+
+def rows(*tweets):
+    return b"".join(
+        b'%d,%d,"%s",2021-01-01 00:00:00\n' % (user_id, tweet_id, text)
+        for user_id, tweet_id, text in tweets
+    )
+
+
+def archived():
+    archive = read_archive(compaction.COMPACTION_DIR)
+    return [(int(row[0]), int(row[1]), row[2]) for row in archive]
+
+
+def test_compact_dedupes_and_sorts(paths):
+    (paths / "history.csv").write_bytes(HEADER + rows((2, 5, b"e"), (1, 3, b"c")))
+    (paths / "01-01-2021_tweets.csv").write_bytes(
+        HEADER + rows((1, 4, b"d\nmore"), (2, 5, b"e"), (1, 3, b"c"))
+    )
+    stats = compact(log)
+    assert stats["tweets_read"] == 5
+    assert stats["tweets_added"] == 3
+    assert archived() == [(1, 3, "c"), (1, 4, "d\nmore"), (2, 5, "e")]
+
+
+def test_compact_reads_on_from_where_it_got_to(paths):
+    path = paths / "01-01-2021_tweets.csv"
+    path.write_bytes(HEADER + rows((1, 1, b"a")) + b'2,2,"half\n')
+    assert compact(log)["tweets_added"] == 1
+
+    with open(path, "ab") as f:
+        f.write(b'written",2021-01-01 00:00:00\n' + rows((1, 1, b"a")))
+    stats = compact(log)
+    assert stats["tweets_read"] == 2
+    assert stats["tweets_added"] == 1
+    assert archived() == [(1, 1, "a"), (2, 2, "half\nwritten")]
+    assert compact(log)["tweets_read"] == 0
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 1024])
+def test_compact_in_chunks(paths, monkeypatch, chunk_size):
+    monkeypatch.setattr(compaction, "READ_CHUNK_SIZE", chunk_size)
+    monkeypatch.setattr(compaction, "COMPACTION_MAX_SEGMENTS", 4)
+    tweets = [(i % 7, i, b"tweet\n%d" % i) for i in range(50)]
+    (paths / "history.csv").write_bytes(HEADER + rows(*tweets, *tweets[:10]))
+
+    stats = compact(log)
+    assert stats["tweets_read"] == 60
+    assert stats["tweets_added"] == 50
+    assert stats["segments"] <= 4
+    expected = sorted((user_id, i, text.decode()) for user_id, i, text in tweets)
+    assert archived() == expected
+
+
+def test_compact_files_without_a_header(paths):
+    # As written before sinks, when the first user written that day had no tweets
+    (paths / "01-01-2021_tweets.csv").write_bytes(b"\n" + rows((1, 5, b"a")) + b"\n")
+    (paths / "02-01-2021_tweets.csv").write_bytes(rows((2, 6, b"b")))
+    stats = compact(log)
+    assert stats["tweets_read"] == 2
+    assert archived() == [(1, 5, "a"), (2, 6, "b")]
+
+
+def test_compact_rejects_other_columns(paths):
+    (paths / "history.csv").write_bytes(b"user,tweet\n1,2\n")
+    with pytest.raises(ValueError):
+        compact(log)
@@ -0,0 +1,81 @@
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from lena_tweets import friend_graph
+from lena_tweets.friend_graph import (
+    FOLLOW,
+    INITIAL,
+    UNFOLLOW,
+    friends_on,
+    load_friends,
+    read_events,
+    record_friends,
+)
+
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        friend_graph, "FRIEND_EVENTS_PATH", str(tmp_path / "friend_events.csv")
+    )
+    monkeypatch.setattr(
+        friend_graph, "FRIEND_SNAPSHOTS_DIR", str(tmp_path / "friend_snapshots")
+    )
+    monkeypatch.setattr(friend_graph, "FRIEND_SPOOL_DIR", str(tmp_path / "spool"))
+
+
+def events():
+    return [
+        (row.user_id, row.friends_id, row.event)
+        for row in read_events().itertuples(index=False)
+    ]
+
+
+def test_first_fetch_is_recorded_as_initial():
+    followed, unfollowed = record_friends(1, [30, 10, 20, 10], datetime(2021, 1, 1))
+    assert not len(followed) and not len(unfollowed)
+    assert list(load_friends(1)) == [10, 20, 30]
+    assert events() == [(1, 10, INITIAL), (1, 20, INITIAL), (1, 30, INITIAL)]
+
+
+def test_only_changes_are_recorded_after():
+    record_friends(1, [10, 20, 30], datetime(2021, 1, 1))
+    followed, unfollowed = record_friends(
+        1, np.array([20, 30, 40, 50]), datetime(2021, 1, 2)
+    )
+    assert list(followed) == [40, 50]
+    assert list(unfollowed) == [10]
+    assert events()[3:] == [(1, 40, FOLLOW), (1, 50, FOLLOW), (1, 10, UNFOLLOW)]
+    assert list(load_friends(1)) == [20, 30, 40, 50]
+
+
+def test_nothing_is_recorded_without_changes():
+    record_friends(1, [10, 20], datetime(2021, 1, 1))
+    followed, unfollowed = record_friends(1, [20, 10], datetime(2021, 1, 2))
+    assert not len(followed) and not len(unfollowed)
+    assert len(events()) == 2
+
+
+def test_empty_first_fetch_leaves_a_snapshot():
+    record_friends(2, [], datetime(2021, 1, 1))
+    assert not len(read_events())
+    followed, _ = record_friends(2, [5], datetime(2021, 1, 2))
+    assert list(followed) == [5]
+    assert events() == [(2, 5, FOLLOW)]
+
+
+def test_friends_on_rebuilds_follow_lists():
+    record_friends(1, [10, 20], datetime(2021, 1, 1, 9))
+    record_friends(2, [10], datetime(2021, 1, 1, 9))
+    record_friends(1, [20, 30], datetime(2021, 1, 2, 9))
+    record_friends(1, [10, 20, 30], datetime(2021, 1, 3, 9))
+
+    def following(day):
+        return [tuple(row) for row in friends_on(day).itertuples(index=False)]
+
+    assert following(date(2020, 12, 31)) == []
+    assert following(date(2021, 1, 1)) == [(1, 10), (1, 20), (2, 10)]
+    assert following(date(2021, 1, 2)) == [(1, 20), (1, 30), (2, 10)]
+    assert following(date(2021, 1, 3)) == [(1, 10), (1, 20), (1, 30), (2, 10)]
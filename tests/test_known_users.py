@@ -0,0 +1,33 @@
+import numpy as np
+
+from lena_tweets.known_users import KnownUsers
+
+
+def test_empty():
+    known = KnownUsers()
+    assert len(known) == 0
+    assert 1 not in known
+    assert list(known.new([3, 1, 3])) == [1, 3]
+
+
+def test_contains():
+    known = KnownUsers(np.array([30, 10, 20]))
+    assert all(user_id in known for user_id in (10, 20, 30))
+    assert not any(user_id in known for user_id in (0, 15, 31))
+
+
+def test_new_drops_known_and_repeated_ids():
+    known = KnownUsers(np.array([10, 20, 30]))
+    assert list(known.new([40, 20, 5, 40, 30, 25])) == [5, 25, 40]
+    assert list(known.new([])) == []
+
+
+def test_add_keeps_ids_sorted_and_distinct():
+    known = KnownUsers(np.array([10, 20]))
+    known.add([15, 20, 5, 15, 2 ** 62])
+    assert len(known) == 5
+    assert all(user_id in known for user_id in (5, 10, 15, 20, 2 ** 62))
+    assert list(known.new([5, 16, 2 ** 62])) == [16]
+
+    known.add([])
+    assert len(known) == 5
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pendulum
+import pytest
+from dagster.utils.partitions import (
+    DEFAULT_HOURLY_FORMAT_WITHOUT_TIMEZONE,
+    DEFAULT_HOURLY_FORMAT_WITH_TIMEZONE,
+)
+
+from lena_tweets.partition_schedule import (
+    minute_partition_range,
+    minute_step,
+    schedule_partition_range,
+)
+
+# Clear of daylight saving changes, which schedule_partition_range can't get past
+START = datetime(2021, 6, 1, 12)
+
+
+def to_partition(execution_time):
+    return pendulum.instance(execution_time).subtract(minutes=1)
+
+
+def partitions(function, start, end, cron, timezone, fmt):
+    if function is minute_partition_range:
+        step = minute_step(cron)
+        return function(start, end, cron, step, fmt, timezone, to_partition)()
+    return function(start, end, cron, fmt, timezone, to_partition)()
+
+
+@pytest.mark.parametrize(
+    "cron, expected",
+    [
+        ("* * * * *", 1),
+        ("*/3 * * * *", 3),
+        ("*/15 * * * *", 15),
+        ("*/7 * * * *", None),
+        ("0 * * * *", None),
+        ("*/5 3 * * *", None),
+    ],
+)
+def test_minute_step(cron, expected):
+    assert minute_step(cron) == expected
+
+
+@pytest.mark.parametrize("cron", ["* * * * *", "*/3 * * * *", "*/15 * * * *"])
+@pytest.mark.parametrize(
+    "timezone, fmt",
+    [
+        ("UTC", DEFAULT_HOURLY_FORMAT_WITH_TIMEZONE),
+        ("America/New_York", DEFAULT_HOURLY_FORMAT_WITH_TIMEZONE),
+        ("America/New_York", DEFAULT_HOURLY_FORMAT_WITHOUT_TIMEZONE),
+    ],
+)
+@pytest.mark.parametrize(
+    "start, end",
+    [
+        (START, START + timedelta(hours=3)),
+        (START + timedelta(seconds=30), START + timedelta(hours=2, seconds=45)),
+        (START - timedelta(seconds=1), START + timedelta(minutes=31, seconds=59)),
+        (START, START + timedelta(minutes=2)),
+    ],
+)
+def test_same_partitions_as_schedule_partition_range(cron, timezone, fmt, start, end):
+    expected = partitions(schedule_partition_range, start, end, cron, timezone, fmt)
+    minute = partitions(minute_partition_range, start, end, cron, timezone, fmt)
+    assert len(minute) == len(expected)
+    assert [p.name for p in minute] == [p.name for p in expected]
+    assert [p.value for p in minute] == [p.value for p in expected]
+
+
+@pytest.mark.parametrize("cron", ["* * * * *", "*/15 * * * *"])
+def test_partitions_are_found_by_name(cron):
+    end = START + timedelta(hours=2)
+    fmt = DEFAULT_HOURLY_FORMAT_WITH_TIMEZONE
+    minute = partitions(minute_partition_range, START, end, cron, "UTC", fmt)
+    assert len(minute)
+    for i, partition in enumerate(minute):
+        assert minute.index(partition.name) == i
+        assert partition in minute
+        assert partition.name in minute
+    assert minute[-1].name == minute[len(minute) - 1].name
+    for name in ["2021-06-01-11:59+0000", "2021-06-01-14:00+0000", "not a partition"]:
+        assert name not in minute
+        with pytest.raises(ValueError):
+            minute.index(name)
+
+
+def test_partitions_between_runs_are_not_found():
+    end = START + timedelta(hours=1)
+    fmt = DEFAULT_HOURLY_FORMAT_WITH_TIMEZONE
+    minute = partitions(minute_partition_range, START, end, "*/15 * * * *", "UTC", fmt)
+    assert [p.name for p in minute] == [
+        "2021-06-01-12:14+0000",
+        "2021-06-01-12:29+0000",
+        "2021-06-01-12:44+0000",
+    ]
+    assert "2021-06-01-12:15+0000" not in minute
+
+
+@pytest.mark.parametrize("cron", ["* * * * *", "*/3 * * * *"])
+def test_empty_range(cron):
+    fmt = DEFAULT_HOURLY_FORMAT_WITH_TIMEZONE
+    expected = partitions(schedule_partition_range, START, START, cron, "UTC", fmt)
+    minute = partitions(minute_partition_range, START, START, cron, "UTC", fmt)
+    assert len(expected) == len(minute) == 0
+    assert list(minute) == []
+    assert "2021-06-01-12:00+0000" not in minute
+    with pytest.raises(IndexError):
+        minute[0]
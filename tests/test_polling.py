@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from lena_tweets.config import (
+    TWEET_POLL_MAX_INTERVAL,
+    TWEET_POLL_MIN_INTERVAL,
+    TWEET_POLL_TARGET,
+    TWEET_RATE_SMOOTHING,
+)
+from lena_tweets.polling import estimate_tweet_rate, next_poll_due
+from lena_tweets.records import TweetRecord
+
+NOW = datetime(2021, 1, 1, 12)
+
+
+def tweets(n, hours_ago):
+    """n tweets, the oldest posted hours_ago"""
+    created_at = datetime.utcnow() - timedelta(hours=hours_ago)
+    return [TweetRecord(1, i, "text", created_at) for i in range(n)]
+
+
+def test_first_poll_spreads_tweets_since_the_oldest():
+    assert estimate_tweet_rate(None, None, tweets(20, 10)) == pytest.approx(2, 1e-3)
+
+
+def test_first_poll_without_tweets():
+    assert estimate_tweet_rate(None, None, []) == 0
+
+
+def test_rate_is_observed_over_at_least_an_hour():
+    assert estimate_tweet_rate(None, None, tweets(3, 0)) == pytest.approx(3)
+    last_polled = datetime.now() - timedelta(minutes=5)
+    assert estimate_tweet_rate(None, last_polled, tweets(3, 0)) == pytest.approx(3)
+
+
+def test_rate_is_smoothed_over_polls():
+    last_polled = datetime.now() - timedelta(hours=4)
+    rate = estimate_tweet_rate(10, last_polled, tweets(8, 4))
+    expected = TWEET_RATE_SMOOTHING * 2 + (1 - TWEET_RATE_SMOOTHING) * 10
+    assert rate == pytest.approx(expected, 1e-3)
+
+
+def test_quiet_polls_bring_the_rate_down():
+    last_polled = datetime.now() - timedelta(hours=1)
+    rate = estimate_tweet_rate(8, last_polled, [])
+    assert rate == pytest.approx((1 - TWEET_RATE_SMOOTHING) * 8)
+
+
+def test_next_poll_due_when_about_target_tweets_are_posted():
+    rate = TWEET_POLL_TARGET / 2
+    assert next_poll_due(rate, NOW) == NOW + timedelta(hours=2)
+
+
+@pytest.mark.parametrize(
+    "rate, interval",
+    [
+        (TWEET_POLL_TARGET * 1000, TWEET_POLL_MIN_INTERVAL),
+        (TWEET_POLL_TARGET / 1000, TWEET_POLL_MAX_INTERVAL),
+        (0, TWEET_POLL_MAX_INTERVAL),
+    ],
+)
+def test_next_poll_due_is_clamped(rate, interval):
+    assert next_poll_due(rate, NOW) == NOW + timedelta(seconds=interval)
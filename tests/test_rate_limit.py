@@ -0,0 +1,105 @@
+import pytest
+import tweepy
+
+from lena_tweets import rate_limit
+from lena_tweets.rate_limit import RESET_MARGIN_SECONDS, WINDOW_SECONDS, CredentialPool
+
+
+class Response:
+    def __init__(self, **headers):
+        self.headers = {
+            f"x-rate-limit-{name}": str(value) for name, value in headers.items()
+        }
+
+
+@pytest.fixture
+def now(monkeypatch):
+    """The time rate_limit sees, which tests move on by hand"""
+    clock = [1_000_000.0]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: clock[0])
+    return clock
+
+
+def test_acquire_hands_out_the_credential_with_most_budget_left(now):
+    pool = CredentialPool(2, {"users/show": 3})
+    taken = [pool.acquire("users/show") for _ in range(6)]
+    assert sorted(taken) == [0, 0, 0, 1, 1, 1]
+    # Never more than one call apart
+    assert abs(taken[:4].count(0) - taken[:4].count(1)) <= 1
+
+
+def test_acquire_raises_once_every_credential_is_out_of_budget(now):
+    pool = CredentialPool(2, {"users/show": 1})
+    pool.acquire("users/show")
+    pool.acquire("users/show")
+    with pytest.raises(tweepy.RateLimitError):
+        pool.acquire("users/show")
+
+
+def test_window_starts_with_the_first_call_and_resets_after_it(now):
+    pool = CredentialPool(1, {"users/show": 2})
+    pool.acquire("users/show")
+    now[0] += 10
+    pool.acquire("users/show")
+    assert pool.seconds_until_available("users/show") == WINDOW_SECONDS - 10
+
+    now[0] += WINDOW_SECONDS - 10
+    assert pool.seconds_until_available("users/show") == 0
+    pool.acquire("users/show")
+    pool.acquire("users/show")
+
+
+def test_budgets_are_kept_per_endpoint(now):
+    pool = CredentialPool(1, {"users/show": 1, "friends/ids": 1})
+    pool.acquire("users/show")
+    assert pool.seconds_until_available("users/show") > 0
+    assert pool.seconds_until_available("friends/ids") == 0
+
+
+def test_update_takes_what_twitter_reports(now):
+    pool = CredentialPool(1, {"users/show": 900})
+    pool.acquire("users/show")
+    reset = int(now[0]) + 300
+    pool.update(0, "users/show", Response(limit=900, remaining=0, reset=reset))
+    assert pool.seconds_until_available("users/show") == pytest.approx(
+        reset + RESET_MARGIN_SECONDS - now[0]
+    )
+
+    now[0] = reset + RESET_MARGIN_SECONDS
+    assert pool.seconds_until_available("users/show") == 0
+
+
+def test_update_without_headers_keeps_the_budget(now):
+    pool = CredentialPool(1, {"users/show": 5})
+    pool.acquire("users/show")
+    pool.update(0, "users/show", None)
+    for _ in range(4):
+        pool.acquire("users/show")
+    with pytest.raises(tweepy.RateLimitError):
+        pool.acquire("users/show")
+
+
+def test_exhaust_uses_up_the_budget_until_reset(now):
+    pool = CredentialPool(2, {"friends/ids": 15})
+    pool.exhaust(0, "friends/ids", Response(reset=int(now[0]) + 60))
+    assert all(pool.acquire("friends/ids") == 1 for _ in range(15))
+    assert pool.seconds_until_available("friends/ids") == pytest.approx(
+        60 + RESET_MARGIN_SECONDS
+    )
+
+
+def test_disabled_credentials_are_not_handed_out(now):
+    pool = CredentialPool(2, {"users/show": 5})
+    pool.disable(0)
+    assert [pool.acquire("users/show") for _ in range(5)] == [1] * 5
+    with pytest.raises(tweepy.RateLimitError):
+        pool.acquire("users/show")
+
+    pool.disable(1)
+    with pytest.raises(ValueError):
+        pool.acquire("users/show")
+
+
+def test_no_credentials():
+    with pytest.raises(ValueError):
+        CredentialPool(0).acquire("users/show")
@@ -0,0 +1,63 @@
+import csv
+import io
+from datetime import datetime
+
+import pytest
+
+from lena_tweets.records import TweetRecord, parse_created_at, tweet_records
+
+
+@pytest.mark.parametrize(
+    "created_at",
+    [
+        "Wed Oct 10 20:19:24 +0000 2018",
+        "Fri Jan 01 00:00:00 +0000 2021",
+        "Sun Dec 31 23:59:59 +0000 2017",
+        "Mon Feb 29 12:05:09 +0000 2016",
+    ],
+)
+def test_parse_created_at_matches_strptime(created_at):
+    expected = datetime.strptime(created_at, "%a %b %d %H:%M:%S +0000 %Y")
+    parsed = parse_created_at(created_at)
+    assert parsed == expected
+    assert parsed.tzinfo is None
+
+
+def test_from_json_keeps_the_stored_fields():
+    tweet = {
+        "id": 1050118621198921728,
+        "text": "To make room for more expression",
+        "created_at": "Wed Oct 10 20:19:24 +0000 2018",
+        "user": {"id": 6253282},
+    }
+    record = TweetRecord.from_json(6253282, tweet)
+    assert record.as_row() == (
+        6253282,
+        1050118621198921728,
+        "To make room for more expression",
+        datetime(2018, 10, 10, 20, 19, 24),
+    )
+
+
+def test_rows_follow_slots():
+    record = TweetRecord(1, 2, "text", datetime(2021, 1, 1))
+    assert record.as_row() == tuple(
+        getattr(record, name) for name in TweetRecord.__slots__
+    )
+
+
+def test_rows_survive_csv():
+    record = TweetRecord(1, 2, 'a "quoted"\nline, with commas', datetime(2021, 1, 1))
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(record.as_row())
+    row = next(csv.reader(io.StringIO(buffer.getvalue(), newline="")))
+    assert row == ["1", "2", 'a "quoted"\nline, with commas', "2021-01-01 00:00:00"]
+
+
+def test_tweet_records_takes_user_id_as_str():
+    tweets = [
+        {"id": i, "text": f"tweet {i}", "created_at": "Fri Jan 01 00:00:00 +0000 2021"}
+        for i in (3, 2)
+    ]
+    records = tweet_records("7", tweets)
+    assert [record.as_row()[:2] for record in records] == [(7, 3), (7, 2)]
@@ -0,0 +1,108 @@
+import pytest
+import tweepy
+
+from lena_tweets import retry
+from lena_tweets.retry import (
+    FATAL,
+    NOT_AUTHORIZED,
+    RATE_LIMITED,
+    RETRYABLE,
+    classify_error,
+    is_bad_credential,
+    is_not_authorized,
+    retry_decorator,
+)
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def error(status=None, code=None):
+    response = None if status is None else Response(status)
+    return tweepy.TweepError("failed", response=response, api_code=code)
+
+
+@pytest.mark.parametrize(
+    "exc, kind",
+    [
+        (tweepy.RateLimitError("rate limited"), RATE_LIMITED),
+        (error(400, 88), RATE_LIMITED),
+        (error(429), RATE_LIMITED),
+        (error(420), RATE_LIMITED),
+        (error(401, 179), NOT_AUTHORIZED),
+        (error(401), NOT_AUTHORIZED),
+        (error(503, 130), RETRYABLE),
+        (error(500, 131), RETRYABLE),
+        (error(502), RETRYABLE),
+        (error(), RETRYABLE),
+        (error(404, 34), FATAL),
+        (error(403, 63), FATAL),
+        (error(401, 89), FATAL),
+        (error(401, 32), FATAL),
+        (error(400, 215), FATAL),
+        (error(400), FATAL),
+    ],
+)
+def test_classify_error(exc, kind):
+    assert classify_error(exc) == kind
+
+
+def test_revoked_credentials_are_not_protected_accounts():
+    assert is_not_authorized(error(401))
+    assert not is_not_authorized(error(401, 89))
+    assert is_bad_credential(error(401, 89))
+    assert is_bad_credential(error(401, [32]))
+    assert not is_bad_credential(error(401))
+    assert not is_bad_credential(error(404, 34))
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(retry.time, "sleep", slept.append)
+    return slept
+
+
+def failing(*errors):
+    """A call that raises errors in turn, then returns how often it was called"""
+    calls = []
+
+    def call(log):
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return len(calls)
+
+    return call
+
+
+def test_retries_retryable_errors(sleeps):
+    call = retry_decorator(endpoint="test")(failing(error(503, 130), error(502)))
+    assert call(None) == 3
+    assert len(sleeps) == 2
+
+
+@pytest.mark.parametrize(
+    "exc", [tweepy.RateLimitError("rate limited"), error(401), error(404, 34)]
+)
+def test_raises_other_errors_straight_away(sleeps, exc):
+    call = retry_decorator(endpoint="test")(failing(exc))
+    with pytest.raises(tweepy.TweepError):
+        call(None)
+    assert not sleeps
+
+
+def test_gives_up_after_total_retry_number(sleeps):
+    call = retry_decorator(total_retry_number=3, endpoint="test")(
+        failing(*[error(502)] * 5)
+    )
+    with pytest.raises(tweepy.TweepError):
+        call(None)
+    assert len(sleeps) == 2
+
+
+def test_backoff_delay_stays_under_the_cap():
+    for try_number in range(20):
+        assert 0 <= retry.backoff_delay(try_number, base=1, cap=60) <= 60
@@ -0,0 +1,117 @@
+import logging
+
+import pytest
+import tweepy
+
+from lena_tweets import scrape_twitter
+from lena_tweets.rate_limit import CredentialPool
+
+log = logging.getLogger(__name__)
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+
+def error(status, code=None):
+    return tweepy.TweepError("failed", response=Response(status), api_code=code)
+
+
+class Client:
+    """Stands in for the client of a credential, answering get_user with answers"""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+        self.last_response = None
+        self.calls = 0
+
+    def get_user(self, *args, **kwargs):
+        self.calls += 1
+        answer = self.answers.pop(0) if len(self.answers) > 1 else self.answers[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """Clients by credential id, used by _call_api through a fresh credential pool"""
+    clients = {}
+    monkeypatch.setattr(
+        scrape_twitter, "credential_pool", CredentialPool(2, {"users/show": 10})
+    )
+    monkeypatch.setattr(scrape_twitter, "get_client", clients.__getitem__)
+    return clients
+
+
+def test_call_api_drops_rejected_credentials(clients):
+    clients[0] = Client(error(401, 89))
+    clients[1] = Client("user")
+    results = [scrape_twitter._call_api("users/show", "get_user", 1) for _ in range(4)]
+    assert results == ["user"] * 4
+    assert clients[0].calls == 1
+    assert clients[1].calls == 4
+
+
+def test_call_api_raises_errors_about_the_user(clients):
+    clients[0] = Client(error(401))
+    clients[1] = Client(error(401))
+    with pytest.raises(tweepy.TweepError):
+        scrape_twitter._call_api("users/show", "get_user", 1)
+    assert clients[0].calls + clients[1].calls == 1
+
+
+@pytest.fixture
+def timeline(monkeypatch):
+    """Tweet ids of a user's timeline, served by get_user_tweets like the api would"""
+    ids = []
+    pages = []
+
+    def get_user_tweets(log, user_id, since_id=None, max_id=None, count=200, **kwargs):
+        page = [
+            {"id": tweet_id}
+            for tweet_id in sorted(ids, reverse=True)
+            if (since_id is None or tweet_id > since_id)
+            and (max_id is None or tweet_id <= max_id)
+        ][:count]
+        pages.append(page)
+        return page
+
+    monkeypatch.setattr(scrape_twitter, "get_user_tweets", get_user_tweets)
+    return ids, pages
+
+
+def new_tweets(since_id, count):
+    tweets = scrape_twitter.get_new_tweets(log, 1, since_id=since_id, count=count)
+    return [tweet["id"] for tweet in tweets]
+
+
+def test_get_new_tweets_stops_once_since_id_comes_back(timeline):
+    ids, pages = timeline
+    ids.extend(range(1, 11))
+    assert new_tweets(7, count=5) == [10, 9, 8]
+    assert len(pages) == 1
+
+
+def test_get_new_tweets_pages_on_while_every_tweet_is_new(timeline):
+    ids, pages = timeline
+    ids.extend(range(1, 21))
+    assert new_tweets(5, count=4) == list(range(20, 5, -1))
+    assert [len(page) for page in pages] == [4, 4, 4, 4]
+
+
+def test_get_new_tweets_with_the_since_tweet_deleted(timeline):
+    ids, pages = timeline
+    ids.extend([2, 3, 4, 8, 9])
+    # With tweet 7 deleted, only an empty page shows there is no gap left
+    assert new_tweets(7, count=2) == [9, 8]
+    assert [len(page) for page in pages] == [2, 0]
+
+
+def test_get_new_tweets_without_since_id(timeline):
+    ids, pages = timeline
+    ids.extend(range(1, 11))
+    assert new_tweets(None, count=3) == [10, 9, 8]
+    assert len(pages) == 1
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+import pytest
+
+from lena_tweets import sinks
+from lena_tweets.config import SINK_FLUSH_INTERVAL
+from lena_tweets.records import TweetRecord
+from lena_tweets.sinks import CsvSink
+
+HEADER = "user_id,id,text,created_at\n"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Seconds on the clock sinks go by, moved on by adding to clock[0]"""
+    clock = [1000.0]
+    monkeypatch.setattr(sinks.time, "monotonic", lambda: clock[0])
+    return clock
+
+
+def record(tweet_id):
+    return TweetRecord(1, tweet_id, "text", datetime(2021, 1, 1, 12))
+
+
+def lines(path):
+    return path.read_text().splitlines(keepends=True)
+
+
+def test_written_out_once_the_buffer_is_full(tmp_path, clock):
+    path = tmp_path / "tweets.csv"
+    written = []
+    with CsvSink(str(path), buffer_size=3) as sink:
+        sink.write([record(1), record(2)], lambda: written.append("first"))
+        assert not path.exists() and written == []
+        sink.write([record(3)], lambda: written.append("second"))
+        assert len(lines(path)) == 4
+        assert written == ["first", "second"]
+        assert sink.n_written == 3
+
+
+def test_callbacks_run_in_order_once_written_out(tmp_path, clock):
+    path = tmp_path / "tweets.csv"
+    written = []
+
+    def on_written(name):
+        # Written out and synced before the callback runs
+        return lambda: written.append((name, len(lines(path))))
+
+    sink = CsvSink(str(path), buffer_size=10)
+    sink.write([record(1)], on_written("a"))
+    sink.write([], on_written("b"))
+    sink.write([record(2)], on_written("c"))
+    assert written == []
+    sink.close()
+    assert written == [("a", 3), ("b", 3), ("c", 3)]
+
+
+def test_written_out_once_the_interval_has_passed(tmp_path, clock):
+    path = tmp_path / "tweets.csv"
+    with CsvSink(str(path), buffer_size=10) as sink:
+        sink.write([record(1)])
+        clock[0] += SINK_FLUSH_INTERVAL - 1
+        sink.write([record(2)])
+        assert sink.n_written == 0
+        clock[0] += 1
+        sink.write([record(3)])
+        assert sink.n_written == 3
+
+
+def test_flush_if_due_within(tmp_path, clock):
+    path = tmp_path / "tweets.csv"
+    with CsvSink(str(path), buffer_size=10) as sink:
+        sink.write([record(1)])
+        clock[0] += SINK_FLUSH_INTERVAL - 10
+        sink.flush_if_due()
+        sink.flush_if_due(within=5)
+        assert sink.n_written == 0
+        sink.flush_if_due(within=10)
+        assert sink.n_written == 1
+
+        # The interval starts over from the write out
+        sink.write([record(2)])
+        sink.flush_if_due(within=10)
+        assert sink.n_written == 1
+
+
+def test_header_only_in_new_files(tmp_path, clock):
+    path = tmp_path / "tweets.csv"
+    with CsvSink(str(path)) as sink:
+        sink.write([record(1)])
+    with CsvSink(str(path)) as sink:
+        sink.write([record(2)])
+    assert lines(path) == [
+        HEADER,
+        "1,1,text,2021-01-01 12:00:00\n",
+        "1,2,text,2021-01-01 12:00:00\n",
+    ]
+
+
+def test_nothing_written_without_records(tmp_path, clock):
+    path = tmp_path / "tweets.csv"
+    written = []
+    with CsvSink(str(path)) as sink:
+        sink.write([], lambda: written.append(1))
+    assert written == [1]
+    assert not path.exists()
@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+
+from lena_tweets.tweet_reader import TweetReader, _blocks, _row_ranges
+
+HEADER = b"user_id,id,text,created_at\n"
+
+
+def row(user_id, tweet_id, text, day):
+    return b'%d,%d,"%s",2021-01-%02d 12:00:00\n' % (user_id, tweet_id, text, day)
+
+
+def test_row_ranges():
+    data = b'1,2,a,x\n3,4,"b\nc",x\n5,6,"d ""e""\nf\ng",x\n7,8,"h'
+    ranges = list(_row_ranges(data))
+    assert [data[start:end] for start, end in ranges] == [
+        b"1,2,a,x\n",
+        b'3,4,"b\nc",x\n',
+        b'5,6,"d ""e""\nf\ng",x\n',
+    ]
+
+
+def test_row_ranges_without_complete_rows():
+    assert list(_row_ranges(b"")) == []
+    assert list(_row_ranges(b'1,2,"open\n')) == []
+
+
+def test_blocks_group_consecutive_rows_of_a_user():
+    runs = [row(1, 1, b"a", 3) + row(1, 2, b"b\nc", 1), row(2, 3, b"d", 2)]
+    runs.append(row(1, 4, b"e", 5))
+    data = HEADER + b"".join(runs)
+    blocks = list(_blocks(data, 100, True, "daily.csv"))
+    ends = [100 + len(HEADER) + len(b"".join(runs[: i + 1])) for i in range(3)]
+    assert [block[:3] for block in blocks] == [
+        (1, 100 + len(HEADER), ends[0]),
+        (2, ends[0], ends[1]),
+        (1, ends[1], ends[2]),
+    ]
+    assert blocks[0][3:] == ("2021-01-01 12:00:00", "2021-01-03 12:00:00")
+
+
+def test_blocks_without_a_header():
+    # As written before sinks, when the first user written that day had no tweets
+    data = b"\n" + row(1, 1, b"a", 1) + b"\n" + row(1, 2, b"b", 2) + b"\n"
+    blocks = list(_blocks(data, 0, True, "daily.csv"))
+    assert [block[:3] for block in blocks] == [
+        (1, 1, 1 + len(row(1, 1, b"a", 1))),
+        (1, len(data) - 1 - len(row(1, 2, b"b", 2)), len(data) - 1),
+    ]
+
+
+def test_blocks_reject_other_columns():
+    with pytest.raises(ValueError):
+        list(_blocks(b"user,tweet\n1,2\n", 0, True, "daily.csv"))
+
+
+def test_tweets_by_time_range(tmp_path):
+    paths = [tmp_path / "history.csv", tmp_path / "daily.csv"]
+    paths[0].write_bytes(
+        HEADER + row(1, 10, b"a", 1) + row(2, 20, b"b", 1) + row(1, 11, b"c\nd", 2)
+    )
+    paths[1].write_bytes(HEADER + row(1, 11, b"c\nd", 2) + row(1, 12, b"e", 4))
+
+    with TweetReader(str(tmp_path / "index.sqlite")) as reader:
+        reader.update([str(path) for path in paths])
+
+        def ids(*args):
+            return [record.id for record in reader.tweets(*args)]
+
+        assert ids(1) == [10, 11, 12]
+        assert ids(2) == [20]
+        assert ids(3) == []
+        assert ids(1, datetime(2021, 1, 2)) == [11, 12]
+        assert ids(1, datetime(2021, 1, 2), datetime(2021, 1, 4)) == [11]
+        assert reader.tweets(1)[1].text == "c\nd"
+
+
+def test_update_indexes_what_was_appended(tmp_path):
+    path = tmp_path / "daily.csv"
+    path.write_bytes(HEADER + row(1, 10, b"a", 1) + b'1,11,"half')
+    with TweetReader(str(tmp_path / "index.sqlite")) as reader:
+        reader.update([str(path)])
+        assert [record.id for record in reader.tweets(1)] == [10]
+
+        with open(path, "ab") as f:
+            f.write(b' written",2021-01-02 12:00:00\n' + row(1, 12, b"b", 3))
+        assert reader.update([str(path)]) == 1
+        records = reader.tweets(1)
+        assert [record.id for record in records] == [10, 11, 12]
+        assert records[1].text == "half written"
+        assert reader.update([str(path)]) == 0
+
+
+def test_files_without_a_header(tmp_path):
+    path = tmp_path / "daily.csv"
+    path.write_bytes(b"\n" + row(1, 10, b"a", 1) + b"\n" + row(1, 11, b"b", 2))
+    with TweetReader(str(tmp_path / "index.sqlite")) as reader:
+        reader.update([str(path)])
+        assert [record.id for record in reader.tweets(1)] == [10, 11]